@@ -1,19 +1,37 @@
+-- Trigram matching for vendor search, and btree_gin so one GIN index can also hold user_id
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- Range partitioned on receipt_date (see create_receipts_partition below), so each month's rows and
+-- indexes are small and old months can be compacted or archived on their own. The primary key has to
+-- include the partition key.
 CREATE TABLE receipts (
-    receipt_id UUID PRIMARY KEY,              -- Unique identifier for each receipt
+    receipt_id UUID NOT NULL,                 -- Unique identifier for each receipt
     user_id UUID NOT NULL,            -- ID of the user
     category VARCHAR(20) NOT NULL,           -- Category of the receipt
     receipt_date DATE NOT NULL,               -- Date of the receipt
     vendor_name VARCHAR(255) NOT NULL,                 -- Vendor's name
     total_amount NUMERIC(10, 2) NOT NULL,              -- Total amount in currency
-    s3_url TEXT DEFAULT NULL                     -- URL of the receipt in S3
-);
+    s3_url TEXT DEFAULT NULL,                    -- URL of the receipt in S3
+    vendor_key TEXT DEFAULT NULL,                -- Normalized vendor for search and grouping, set by trg_receipts_vendor_key
+    thumbnail_url TEXT DEFAULT NULL,             -- URL of the list-view thumbnail the OCR worker writes next to s3_url
+    PRIMARY KEY (receipt_id, receipt_date)
+) PARTITION BY RANGE (receipt_date);
 
--- Index for faster querying by user_id and category
-CREATE INDEX idx_user_category ON receipts (user_id, category);
+-- Catches rows no partition covers (misread dates, history older than the first partition). Rows in
+-- recent periods are moved into a partition of their own by ensure_receipts_partitions; the rest stay here.
+CREATE TABLE receipts_default PARTITION OF receipts DEFAULT;
 
--- Index for querying by user_id and receipt_date
+-- Index for querying by user_id and receipt_date, created on every partition
 CREATE INDEX idx_user_date ON receipts (user_id, receipt_date);
 
+-- Index for faster querying by user_id and category. Created per partition rather than on the parent
+-- so compact_receipts_partitions can replace it with a BRIN index once a partition goes cold.
+CREATE INDEX receipts_default_user_category_idx ON receipts_default (user_id, category);
+
+-- Vendor search: trigram LIKE and similarity matching on vendor_key within one user's receipts
+CREATE INDEX idx_receipts_vendor_trgm ON receipts USING gin (user_id, vendor_key gin_trgm_ops);
+
 CREATE TABLE users (
     user_id UUID PRIMARY KEY, 
     email VARCHAR(255) NOT NULL UNIQUE,
@@ -22,7 +40,423 @@ CREATE TABLE users (
     budget NUMERIC(10, 2) DEFAULT 0.00 -- Monthly budget
 );
 
-CREATE INDEX idx_users_email ON users (email);
+-- Covers the login credential lookup so it is answered from the index alone
+CREATE INDEX idx_users_email ON users (email) INCLUDE (user_id, password);
 
 ALTER TABLE receipts
-ADD CONSTRAINT fk_receipts_users FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE;
\ No newline at end of file
+ADD CONSTRAINT fk_receipts_users FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE;
+
+-- Per user monthly totals by category, kept in sync with receipts by trg_receipts_monthly_expenses
+CREATE TABLE monthly_expenses (
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    year SMALLINT NOT NULL,
+    month SMALLINT NOT NULL,
+    category VARCHAR(20) NOT NULL,
+    total_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,   -- Sum of receipts.total_amount
+    receipt_count INTEGER NOT NULL DEFAULT 0,         -- Number of receipts in the bucket
+    PRIMARY KEY (user_id, year, month, category)
+);
+
+CREATE OR REPLACE FUNCTION apply_monthly_expense(p_user_id UUID, p_date DATE, p_category VARCHAR, p_amount NUMERIC, p_count INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    -- Removals only shrink an existing bucket. Never insert for them: when a user is deleted the
+    -- cascade may already have removed their buckets, and the user row is gone too.
+    IF p_count < 0 THEN
+        UPDATE monthly_expenses
+        SET total_amount = total_amount + p_amount,
+            receipt_count = receipt_count + p_count
+        WHERE user_id = p_user_id
+          AND year = extract(year FROM p_date)
+          AND month = extract(month FROM p_date)
+          AND category = p_category;
+
+        DELETE FROM monthly_expenses
+        WHERE user_id = p_user_id
+          AND year = extract(year FROM p_date)
+          AND month = extract(month FROM p_date)
+          AND category = p_category
+          AND receipt_count <= 0;
+        RETURN;
+    END IF;
+
+    INSERT INTO monthly_expenses (user_id, year, month, category, total_amount, receipt_count)
+    VALUES (p_user_id, extract(year FROM p_date), extract(month FROM p_date), p_category, p_amount, p_count)
+    ON CONFLICT (user_id, year, month, category) DO UPDATE
+    SET total_amount = monthly_expenses.total_amount + EXCLUDED.total_amount,
+        receipt_count = monthly_expenses.receipt_count + EXCLUDED.receipt_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_monthly_expenses()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_monthly_expense(OLD.user_id, OLD.receipt_date, OLD.category, -OLD.total_amount, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_monthly_expense(NEW.user_id, NEW.receipt_date, NEW.category, NEW.total_amount, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_receipts_monthly_expenses
+AFTER INSERT OR UPDATE OF user_id, receipt_date, category, total_amount OR DELETE ON receipts
+FOR EACH ROW EXECUTE FUNCTION sync_monthly_expenses();
+
+-- Recompute monthly_expenses from receipts for one user, or everyone when p_user_id is NULL
+CREATE OR REPLACE FUNCTION rebuild_monthly_expenses(p_user_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    DELETE FROM monthly_expenses WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+    INSERT INTO monthly_expenses (user_id, year, month, category, total_amount, receipt_count)
+    SELECT user_id, extract(year FROM receipt_date), extract(month FROM receipt_date), category,
+           SUM(total_amount), COUNT(*)
+    FROM receipts
+    WHERE p_user_id IS NULL OR user_id = p_user_id
+    GROUP BY user_id, extract(year FROM receipt_date), extract(month FROM receipt_date), category;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lower-cased vendor name with apostrophes and dots dropped and other punctuation collapsed to single
+-- spaces, so "STARBUCKS  #12" and "Starbucks 12" compare equal
+CREATE OR REPLACE FUNCTION normalize_vendor(p_name TEXT)
+RETURNS TEXT AS $$
+    SELECT btrim(regexp_replace(regexp_replace(lower(p_name), '[''’.]', '', 'g'), '[^[:alnum:]]+', ' ', 'g'));
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+-- Vendor name normalization. OCR reads one merchant as "STARBUCKS #1234", "Starbucks Coffee", ...;
+-- each alias maps one of those forms to the canonical name its receipts are grouped and shown under.
+-- Maintain with add_vendor_alias so existing receipts are rekeyed.
+CREATE TABLE vendor_aliases (
+    alias TEXT PRIMARY KEY,                     -- normalize_vendor() of a vendor name as read
+    vendor_name VARCHAR(255) NOT NULL           -- Canonical name
+);
+
+-- receipts.vendor_key for a vendor name: the normalized canonical name when it has an alias
+CREATE OR REPLACE FUNCTION vendor_key_for(p_name TEXT)
+RETURNS TEXT AS $$
+    SELECT normalize_vendor(coalesce(
+        (SELECT vendor_name FROM vendor_aliases WHERE alias = normalize_vendor(p_name)),
+        p_name
+    ));
+$$ LANGUAGE sql STABLE STRICT;
+
+CREATE OR REPLACE FUNCTION set_vendor_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.vendor_key := vendor_key_for(NEW.vendor_name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_receipts_vendor_key
+BEFORE INSERT OR UPDATE OF vendor_name ON receipts
+FOR EACH ROW EXECUTE FUNCTION set_vendor_key();
+
+-- Group receipts read as p_alias under p_vendor_name and rekey the ones already stored. The canonical
+-- name is also recorded as an alias of itself, which is where search results take their display name from.
+-- Scans every receipt; returns the number rekeyed.
+CREATE OR REPLACE FUNCTION add_vendor_alias(p_alias TEXT, p_vendor_name TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    rekeyed INTEGER;
+BEGIN
+    INSERT INTO vendor_aliases (alias, vendor_name)
+    SELECT DISTINCT alias, p_vendor_name
+    FROM unnest(ARRAY[normalize_vendor(p_alias), normalize_vendor(p_vendor_name)]) AS alias
+    ON CONFLICT (alias) DO UPDATE SET vendor_name = EXCLUDED.vendor_name;
+
+    UPDATE receipts
+    SET vendor_key = normalize_vendor(p_vendor_name)
+    WHERE normalize_vendor(vendor_name) = normalize_vendor(p_alias)
+      AND vendor_key IS DISTINCT FROM normalize_vendor(p_vendor_name);
+    GET DIAGNOSTICS rekeyed = ROW_COUNT;
+    RETURN rekeyed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute receipts.vendor_key for every receipt, e.g. after vendor_aliases was edited by hand or to
+-- fill the column on a database upgraded from before it existed. Returns the number of receipts changed.
+CREATE OR REPLACE FUNCTION rebuild_vendor_keys()
+RETURNS INTEGER AS $$
+DECLARE
+    rekeyed INTEGER;
+BEGIN
+    UPDATE receipts
+    SET vendor_key = vendor_key_for(vendor_name)
+    WHERE vendor_key IS DISTINCT FROM vendor_key_for(vendor_name);
+    GET DIAGNOSTICS rekeyed = ROW_COUNT;
+    RETURN rekeyed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Name and [lower_bound, upper_bound) range of the receipts partition holding p_date.
+-- p_interval is 'month' (receipts_2025_01) or 'year' (receipts_2025); keep to one per database.
+CREATE OR REPLACE FUNCTION receipts_partition_for(p_date DATE, p_interval TEXT DEFAULT 'month',
+                                                  OUT partition_name TEXT, OUT lower_bound DATE, OUT upper_bound DATE)
+AS $$
+BEGIN
+    IF p_interval NOT IN ('month', 'year') THEN
+        RAISE EXCEPTION 'receipts partition interval must be month or year, got %', p_interval;
+    END IF;
+    lower_bound := date_trunc(p_interval, p_date::timestamp)::date;
+    upper_bound := (lower_bound + ('1 ' || p_interval)::interval)::date;
+    partition_name := 'receipts_' || to_char(lower_bound, CASE p_interval WHEN 'year' THEN 'YYYY' ELSE 'YYYY_MM' END);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Attached partitions of receipts with their bounds (NULL for receipts_default)
+CREATE OR REPLACE FUNCTION receipts_partitions()
+RETURNS TABLE (partition_name TEXT, lower_bound DATE, upper_bound DATE, estimated_rows BIGINT, compacted BOOLEAN) AS $$
+    SELECT c.relname::TEXT,
+           substring(pg_get_expr(c.relpartbound, c.oid) FROM 'FROM \(''([^'']+)''\)')::DATE,
+           substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \(''([^'']+)''\)')::DATE,
+           greatest(c.reltuples, 0)::BIGINT,
+           EXISTS (
+               SELECT 1
+               FROM pg_index i
+               JOIN pg_class ic ON ic.oid = i.indexrelid
+               JOIN pg_am am ON am.oid = ic.relam
+               WHERE i.indrelid = c.oid AND am.amname = 'brin'
+           )
+    FROM pg_inherits inh
+    JOIN pg_class c ON c.oid = inh.inhrelid
+    WHERE inh.inhparent = 'receipts'::regclass
+    ORDER BY 2 NULLS FIRST;
+$$ LANGUAGE sql STABLE;
+
+-- Create the partition covering p_date. Returns its name, or NULL when it already exists.
+-- A new range that receipts_default holds rows for is filled by detaching receipts_default, which takes an
+-- ACCESS EXCLUSIVE lock on receipts until the transaction ends: every read and write of receipts waits
+-- while the rows are moved. ensure_receipts_partitions creates partitions ahead of time so this is only
+-- needed for past periods that never had a partition.
+CREATE OR REPLACE FUNCTION create_receipts_partition(p_date DATE, p_interval TEXT DEFAULT 'month')
+RETURNS TEXT AS $$
+DECLARE
+    part RECORD;
+BEGIN
+    SELECT * INTO part FROM receipts_partition_for(p_date, p_interval);
+    IF to_regclass(part.partition_name) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM receipts_default
+                   WHERE receipt_date >= part.lower_bound AND receipt_date < part.upper_bound) THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF receipts FOR VALUES FROM (%L) TO (%L)',
+                       part.partition_name, part.lower_bound, part.upper_bound);
+    ELSE
+        -- A range cannot be added while receipts_default holds rows that fall in it. The rows are moved while
+        -- receipts_default is detached, when neither table carries the receipts triggers, so monthly_expenses
+        -- and vendor_key are left as they are. Attaching builds the new partition's indexes in one pass.
+        ALTER TABLE receipts DETACH PARTITION receipts_default;
+        EXECUTE format('CREATE TABLE %I (LIKE receipts INCLUDING DEFAULTS)', part.partition_name);
+        EXECUTE format('WITH moved AS (DELETE FROM receipts_default WHERE receipt_date >= %L AND receipt_date < %L RETURNING *)
+                        INSERT INTO %I SELECT * FROM moved',
+                       part.lower_bound, part.upper_bound, part.partition_name);
+        EXECUTE format('ALTER TABLE receipts ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       part.partition_name, part.lower_bound, part.upper_bound);
+        ALTER TABLE receipts ATTACH PARTITION receipts_default DEFAULT;
+    END IF;
+    EXECUTE format('CREATE INDEX %I ON %I (user_id, category)',
+                   part.partition_name || '_user_category_idx', part.partition_name);
+    RETURN part.partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Earlier versions took (p_interval, p_ahead) only; drop that one so two-argument calls are not ambiguous
+DROP FUNCTION IF EXISTS ensure_receipts_partitions(TEXT, INTEGER);
+
+-- Create the partitions for the current period and the p_ahead periods after it, plus one for every period
+-- from p_since on with rows waiting in receipts_default. Run daily, the coming periods exist before any
+-- receipt dated in them arrives, so new rows go straight to their partition. Rows outside the window,
+-- mostly misread dates such as 1970 or 2204, stay in receipts_default instead of each getting a partition
+-- (and a lock on receipts, see create_receipts_partition). Returns the partitions created.
+CREATE OR REPLACE FUNCTION ensure_receipts_partitions(p_interval TEXT DEFAULT 'month', p_ahead INTEGER DEFAULT 3,
+                                                      p_since DATE DEFAULT (current_date - interval '12 months')::date)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    current_period DATE := date_trunc(p_interval, current_date::timestamp)::date;
+    window_start DATE := date_trunc(p_interval, p_since::timestamp)::date;
+    window_end DATE := (current_period + (p_ahead + 1) * ('1 ' || p_interval)::interval)::date;
+    period DATE;
+    created TEXT;
+BEGIN
+    FOR period IN
+        SELECT (current_period + step * ('1 ' || p_interval)::interval)::date
+        FROM generate_series(0, p_ahead) AS step
+        UNION
+        SELECT DISTINCT date_trunc(p_interval, receipt_date::timestamp)::date FROM receipts_default
+        WHERE receipt_date >= window_start AND receipt_date < window_end
+        ORDER BY 1
+    LOOP
+        created := create_receipts_partition(period, p_interval);
+        IF created IS NOT NULL THEN
+            RETURN NEXT created;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replace the B-tree category index of each partition ending on or before p_before with a BRIN index on
+-- receipt_date. Old partitions are rarely written, and a BRIN index is a handful of pages where the B-tree
+-- covers every row; per-user reads still go through idx_user_date. Returns the partitions compacted.
+CREATE OR REPLACE FUNCTION compact_receipts_partitions(p_before DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part RECORD;
+BEGIN
+    FOR part IN
+        SELECT * FROM receipts_partitions() p WHERE p.upper_bound <= p_before AND NOT p.compacted
+    LOOP
+        EXECUTE format('DROP INDEX IF EXISTS %I', part.partition_name || '_user_category_idx');
+        EXECUTE format('CREATE INDEX %I ON %I USING brin (receipt_date)',
+                       part.partition_name || '_date_brin_idx', part.partition_name);
+        RETURN NEXT part.partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detach each partition ending on or before p_before and move it to the p_schema schema, where it can be
+-- dumped or dropped. monthly_expenses keeps the archived months' totals, but rebuild_monthly_expenses
+-- only sees attached partitions. Undo with
+--   ALTER TABLE receipts_archive.receipts_2023_01 SET SCHEMA public;
+--   ALTER TABLE receipts ATTACH PARTITION receipts_2023_01 FOR VALUES FROM ('2023-01-01') TO ('2023-02-01');
+-- Returns the archived tables.
+CREATE OR REPLACE FUNCTION archive_receipts_partitions(p_before DATE, p_schema TEXT DEFAULT 'receipts_archive')
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part RECORD;
+BEGIN
+    EXECUTE format('CREATE SCHEMA IF NOT EXISTS %I', p_schema);
+    FOR part IN
+        SELECT * FROM receipts_partitions() p WHERE p.upper_bound <= p_before
+    LOOP
+        EXECUTE format('ALTER TABLE receipts DETACH PARTITION %I', part.partition_name);
+        -- A period archived before and since refilled from receipts_default is merged into its archive table
+        IF to_regclass(format('%I.%I', p_schema, part.partition_name)) IS NOT NULL THEN
+            EXECUTE format('INSERT INTO %I.%I SELECT * FROM %I', p_schema, part.partition_name, part.partition_name);
+            EXECUTE format('DROP TABLE %I', part.partition_name);
+        ELSE
+            EXECUTE format('ALTER TABLE %I SET SCHEMA %I', part.partition_name, p_schema);
+        END IF;
+        RETURN NEXT p_schema || '.' || part.partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Upgrade a database created before receipts was partitioned. Holds an exclusive lock on receipts while
+-- the rows are copied. The old table is kept as receipts_unpartitioned; drop it once the copy is checked.
+-- Returns the number of rows copied.
+CREATE OR REPLACE FUNCTION migrate_receipts_to_partitions(p_interval TEXT DEFAULT 'month')
+RETURNS BIGINT AS $$
+DECLARE
+    copied BIGINT;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'receipts'::regclass) = 'p' THEN
+        RAISE NOTICE 'receipts is already partitioned';
+        RETURN 0;
+    END IF;
+
+    LOCK TABLE receipts IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE receipts RENAME TO receipts_unpartitioned;
+    ALTER TABLE receipts_unpartitioned RENAME CONSTRAINT receipts_pkey TO receipts_unpartitioned_pkey;
+    ALTER TABLE receipts_unpartitioned DROP CONSTRAINT fk_receipts_users;
+    ALTER INDEX idx_user_date RENAME TO receipts_unpartitioned_user_date_idx;
+    ALTER INDEX idx_user_category RENAME TO receipts_unpartitioned_user_category_idx;
+    ALTER INDEX IF EXISTS idx_receipts_vendor_trgm RENAME TO receipts_unpartitioned_vendor_trgm_idx;
+    DROP TRIGGER trg_receipts_monthly_expenses ON receipts_unpartitioned;
+    DROP TRIGGER IF EXISTS trg_receipts_vendor_key ON receipts_unpartitioned;
+
+    -- Same layout as the receipts definition at the top of this file
+    CREATE TABLE receipts (LIKE receipts_unpartitioned INCLUDING DEFAULTS, PRIMARY KEY (receipt_id, receipt_date))
+    PARTITION BY RANGE (receipt_date);
+    ALTER TABLE receipts ADD COLUMN IF NOT EXISTS vendor_key TEXT DEFAULT NULL;
+    ALTER TABLE receipts ADD COLUMN IF NOT EXISTS thumbnail_url TEXT DEFAULT NULL;
+    CREATE TABLE receipts_default PARTITION OF receipts DEFAULT;
+    CREATE INDEX idx_user_date ON receipts (user_id, receipt_date);
+    CREATE INDEX receipts_default_user_category_idx ON receipts_default (user_id, category);
+    ALTER TABLE receipts
+    ADD CONSTRAINT fk_receipts_users FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE;
+
+    PERFORM create_receipts_partition(period, p_interval)
+    FROM (SELECT DISTINCT date_trunc(p_interval, receipt_date::timestamp)::date AS period FROM receipts_unpartitioned) periods;
+    PERFORM ensure_receipts_partitions(p_interval);
+
+    -- Fills vendor_key as the rows are copied
+    CREATE TRIGGER trg_receipts_vendor_key
+    BEFORE INSERT OR UPDATE OF vendor_name ON receipts
+    FOR EACH ROW EXECUTE FUNCTION set_vendor_key();
+
+    -- In date order, so each partition's heap follows receipt_date and its BRIN index stays selective
+    INSERT INTO receipts SELECT * FROM receipts_unpartitioned ORDER BY receipt_date;
+    GET DIAGNOSTICS copied = ROW_COUNT;
+
+    -- Receipts the OCR worker stored before, so their redelivered events stay no-ops
+    CREATE TABLE IF NOT EXISTS ocr_receipts (
+        receipt_id UUID PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    INSERT INTO ocr_receipts (receipt_id)
+    SELECT receipt_id FROM receipts_unpartitioned WHERE s3_url IS NOT NULL
+    ON CONFLICT DO NOTHING;
+    CREATE INDEX idx_receipts_vendor_trgm ON receipts USING gin (user_id, vendor_key gin_trgm_ops);
+
+    -- monthly_expenses already matches the copied rows, so the trigger only goes back on afterwards
+    CREATE TRIGGER trg_receipts_monthly_expenses
+    AFTER INSERT OR UPDATE OF user_id, receipt_date, category, total_amount OR DELETE ON receipts
+    FOR EACH ROW EXECUTE FUNCTION sync_monthly_expenses();
+
+    RETURN copied;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Monthly partitions; call ensure_receipts_partitions('year') here instead for yearly ones
+SELECT ensure_receipts_partitions();
+
+-- Parsed OCR results keyed by SHA-256 of the image bytes, so re-uploaded receipts skip the vision model
+CREATE TABLE ocr_cache (
+    content_hash CHAR(64) PRIMARY KEY,
+    receipt_data JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX idx_ocr_cache_created_at ON ocr_cache (created_at);
+
+-- Receipt ids the OCR worker has inserted. A redelivered S3 event can read a different receipt_date,
+-- and the receipts key includes it, so the worker claims receipt_id here first and skips the insert
+-- when it is already taken. Rows are kept when receipts are deleted or archived.
+CREATE TABLE ocr_receipts (
+    receipt_id UUID PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Durable queue of S3 event records for the OCR worker's poll mode (OCR_RUN_MODE=poll).
+-- Pollers claim rows with FOR UPDATE SKIP LOCKED and hide them until visible_at.
+CREATE TABLE ocr_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    record JSONB NOT NULL,                            -- One entry of an S3 event's Records array
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT DEFAULT NULL,
+    visible_at TIMESTAMPTZ NOT NULL DEFAULT now(),    -- Claimable once this has passed
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX idx_ocr_jobs_visible_at ON ocr_jobs (visible_at, job_id);
+
+-- Jobs that failed OCR_JOB_MAX_ATTEMPTS times
+CREATE TABLE ocr_jobs_dead (
+    job_id BIGINT PRIMARY KEY,
+    record JSONB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT DEFAULT NULL,
+    created_at TIMESTAMPTZ NOT NULL,
+    failed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
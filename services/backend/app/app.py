@@ -1,6 +1,9 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import auth, receipts
+from app.core.db import pool_metrics
+from app.core.cache import response_cache
+from app.core.profiling import ProfilingMiddleware, render_metrics
 
 def create_app() -> FastAPI:
     app = FastAPI(
@@ -20,12 +23,28 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["Server-Timing"],
     )
+    # Added last so it wraps CORS and sees the full request
+    app.add_middleware(ProfilingMiddleware)
 
     @app.get("/health", tags=["health"], summary="Check API health status")
     def health():
         return {"health": "ok"}
 
+    @app.get("/health/db", tags=["health"], summary="Database connection pool metrics")
+    def health_db():
+        return pool_metrics.snapshot()
+
+    @app.get("/health/cache", tags=["health"], summary="Response cache hit counts")
+    def health_cache():
+        return response_cache.stats()
+
+    @app.get("/metrics", tags=["health"], summary="Prometheus metrics", include_in_schema=False)
+    def metrics():
+        content, content_type = render_metrics()
+        return Response(content=content, media_type=content_type)
+
     app.include_router(auth.router)
     app.include_router(receipts.router)
 
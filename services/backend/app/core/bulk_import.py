@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import math
+import tempfile
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+from uuid import uuid4
+from pydantic import ValidationError
+from app.core.models import CATEGORIES
+from app.db.models import CreateReceipt
+
+MAX_VENDOR_LENGTH = 255
+MAX_AMOUNT = Decimal("99999999.99")  # receipts.total_amount is NUMERIC(10, 2)
+CENTS = Decimal("0.01")
+MAX_REPORTED_ERRORS = 1000
+
+COPY_QUERY = """
+    COPY receipts (receipt_id, user_id, category, receipt_date, vendor_name, total_amount)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+
+def read_rows(fileobj, fmt: str):
+    """Yield (row_number, dict) pairs from a CSV (with header) or NDJSON byte stream"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, e
+
+
+def validate_row(row, user_id: str) -> tuple[CreateReceipt | None, list[str]]:
+    if isinstance(row, Exception):
+        return None, [f"Invalid JSON: {row}"]
+    if not isinstance(row, dict):
+        return None, ["Row must be an object"]
+
+    # csv.DictReader files the values past the header under a None key
+    if None in row:
+        return None, ["Row has more fields than the header"]
+
+    try:
+        record = CreateReceipt(**{**row, "user_id": user_id})
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+    except (TypeError, ValueError) as e:
+        return None, [f"Invalid row: {e}"]
+
+    # Checks the table would otherwise enforce by failing the whole COPY
+    errors = []
+    if record.category not in CATEGORIES:
+        errors.append(f"category: must be one of {', '.join(CATEGORIES)}")
+    if len(record.vendor_name) > MAX_VENDOR_LENGTH:
+        errors.append(f"vendor_name: longer than {MAX_VENDOR_LENGTH} characters")
+    if not math.isfinite(record.total_amount):
+        errors.append("total_amount: must be a finite number")
+    else:
+        # Round to cents the way the NUMERIC column will before checking its bound
+        amount = Decimal(str(record.total_amount)).quantize(CENTS, rounding=ROUND_HALF_UP)
+        if not -MAX_AMOUNT <= amount <= MAX_AMOUNT:
+            errors.append("total_amount: out of range")
+        record.total_amount = float(amount)
+    return (None, errors) if errors else (record, [])
+
+
+def import_receipts(connection, fileobj, fmt: str, user_id: str, chunk_size: int) -> dict:
+    """Validate rows chunk by chunk into a CSV buffer, then load every valid row with a single COPY.
+
+    Invalid rows are reported and skipped; valid rows are committed in one transaction.
+    """
+    start = time.perf_counter()
+    errors = []
+    error_count = 0
+    total = 0
+    imported = 0
+
+    rows = read_rows(fileobj, fmt)
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+", newline="") as buffer:
+        writer = csv.writer(buffer)
+        while chunk := list(islice(rows, chunk_size)):
+            for number, row in chunk:
+                total += 1
+                record, row_errors = validate_row(row, user_id)
+                if row_errors:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({"row": number, "errors": row_errors})
+                    continue
+                writer.writerow([
+                    str(uuid4()), user_id, record.category, record.receipt_date.isoformat(),
+                    record.vendor_name, f"{record.total_amount:.2f}",
+                ])
+                imported += 1
+
+        if imported:
+            buffer.seek(0)
+            cursor = connection.cursor()
+            try:
+                cursor.copy_expert(COPY_QUERY, buffer)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "message": "Import complete",
+        "rows": total,
+        "imported": imported,
+        "failed": error_count,
+        "errors": errors,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+    }
@@ -0,0 +1,229 @@
+import hashlib
+import itertools
+import json
+import logging
+import orjson
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request, Response
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Shared with the OCR worker, which bumps the generation key after inserting receipts
+KEY_PREFIX = "expensa:cache"
+
+
+class CachedResponse:
+    def __init__(self, etag: str, body: bytes, headers: dict):
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+
+
+# Backends return a per-user generation with every lookup and only store a value if the
+# generation is unchanged, so a response computed before a write is never cached after it.
+
+class MemoryCache:
+    """In-process LRU with TTL. Entries are indexed per user so a write drops all of that user's responses.
+
+    Only writes made through this process invalidate it, see create_backend.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        # Generations come from one increasing clock, so a user whose generation was evicted gets the
+        # floor, which is at least what they had; a store begun before the eviction is then refused.
+        self._generations = OrderedDict()
+        self._clock = itertools.count(1)
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, key: str) -> tuple[CachedResponse | None, int]:
+        with self._lock:
+            generation = self._generations.get(user_id, self._floor)
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return None, generation
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove((user_id, key))
+                return None, generation
+            self._entries.move_to_end((user_id, key))
+            return value, generation
+
+    def set(self, user_id: str, key: str, value: CachedResponse, generation: int):
+        with self._lock:
+            if self._generations.get(user_id, self._floor) != generation:
+                return
+            self._entries[(user_id, key)] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end((user_id, key))
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._generations[user_id] = next(self._clock)
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_entries:
+                _, evicted = self._generations.popitem(last=False)
+                self._floor = max(self._floor, evicted)
+            for key in self._user_keys.pop(user_id, set()):
+                self._entries.pop((user_id, key), None)
+
+    def _remove(self, entry_key):
+        self._entries.pop(entry_key, None)
+        user_id, key = entry_key
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+
+class RedisCache:
+    """Redis-compatible backend. Each user has a generation counter that is part of every entry key,
+    so invalidation is a single INCR and stale entries simply expire.
+
+    Any client with get/set/incr (redis.Redis, fakeredis, ...) can be passed in.
+    """
+
+    def __init__(self, client, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    def _generation(self, user_id: str) -> int:
+        return int(self.client.get(f"{KEY_PREFIX}:{user_id}:gen") or 0)
+
+    def get(self, user_id: str, key: str) -> tuple[CachedResponse | None, int]:
+        generation = self._generation(user_id)
+        raw = self.client.get(f"{KEY_PREFIX}:{user_id}:{generation}:{key}")
+        if raw is None:
+            return None, generation
+        data = json.loads(raw)
+        return CachedResponse(data["etag"], data["body"].encode("utf-8"), data["headers"]), generation
+
+    def set(self, user_id: str, key: str, value: CachedResponse, generation: int):
+        # Entries written under an old generation are unreachable once the counter moves on
+        data = json.dumps({"etag": value.etag, "body": value.body.decode("utf-8"), "headers": value.headers})
+        self.client.set(f"{KEY_PREFIX}:{user_id}:{generation}:{key}", data, ex=self.ttl)
+
+    def invalidate(self, user_id: str):
+        self.client.incr(f"{KEY_PREFIX}:{user_id}:gen")
+
+
+class NullCache:
+    def get(self, user_id: str, key: str) -> tuple[CachedResponse | None, int]:
+        return None, 0
+
+    def set(self, user_id: str, key: str, value: CachedResponse, generation: int):
+        pass
+
+    def invalidate(self, user_id: str):
+        pass
+
+
+def create_backend():
+    if settings.CACHE_BACKEND == "redis":
+        import redis
+        return RedisCache(redis.Redis.from_url(settings.CACHE_REDIS_URL), settings.CACHE_TTL)
+    if settings.CACHE_BACKEND == "memory":
+        # Other processes cannot reach this cache to invalidate it, so each API worker would serve
+        # responses the others have made stale until CACHE_TTL runs out
+        if settings.WEB_CONCURRENCY > 1:
+            raise RuntimeError(
+                f"CACHE_BACKEND=memory cannot be shared by {settings.WEB_CONCURRENCY} API workers, use redis"
+            )
+        logger.warning(
+            "CACHE_BACKEND=memory is local to this process: receipts stored by the OCR worker reach cached "
+            "stats and expense lists only after CACHE_TTL (%ss). Use CACHE_BACKEND=redis with the worker.",
+            settings.CACHE_TTL,
+        )
+        return MemoryCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL)
+    return NullCache()
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    """Weak comparison of etag against an If-None-Match list (RFC 9110 13.1.2); * matches any current response"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Per-user cache of rendered JSON responses with ETag / If-None-Match support"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup(self, request: Request, user_id: str, endpoint: str) -> tuple[tuple[str, int], Response | None]:
+        """Return the cache slot for this request and, on a hit, the response to send without touching the DB"""
+        key = f"{endpoint}?{request.url.query}"
+        try:
+            cached, generation = self.backend.get(user_id, key)
+        except Exception:
+            cached, generation = None, None
+        if cached is None:
+            self._count("misses")
+            return (key, generation), None
+
+        self._count("hits")
+        if etag_matches(cached.etag, request.headers.get("if-none-match")):
+            self._count("not_modified")
+            return (key, generation), Response(status_code=304, headers={"ETag": cached.etag, "Cache-Control": "private, no-cache"})
+        return (key, generation), self._response(cached)
+
+    def store(self, user_id: str, slot: tuple[str, int], content, headers: dict | None = None) -> Response:
+        # orjson produces the same bytes as JSONResponse for these payloads (compact, UTF-8, shortest floats)
+        body = orjson.dumps(content)
+        cached = CachedResponse(f'"{hashlib.sha1(body).hexdigest()}"', body, headers or {})
+        key, generation = slot
+        if generation is not None:
+            try:
+                self.backend.set(user_id, key, cached, generation)
+            except Exception as e:
+                logger.warning("Could not cache response for %s: %s", user_id, e)
+        return self._response(cached)
+
+    def invalidate(self, user_id: str):
+        try:
+            self.backend.invalidate(user_id)
+        except Exception as e:
+            logger.warning("Could not invalidate cached responses for %s: %s", user_id, e)
+
+    def _response(self, cached: CachedResponse) -> Response:
+        return Response(
+            content=cached.body,
+            media_type="application/json",
+            headers={**cached.headers, "ETag": cached.etag, "Cache-Control": "private, no-cache"},
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": settings.CACHE_BACKEND,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+
+response_cache = ResponseCache(create_backend())
@@ -19,6 +19,14 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "test_db")
 
     DATABASE_URI: str = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Serve the read-heavy routes with async handlers on an asyncpg engine
+    DB_ASYNC: bool = False
     
     S3_BUCKET: str = os.getenv('S3_BUCKET')
     S3_ENDPOINT: str = os.getenv('S3_ENDPOINT')
@@ -27,4 +35,44 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: str = os.getenv('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY: str = os.getenv('AWS_SECRET_ACCESS_KEY')
 
+    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 4
+    PRESIGNED_URL_EXPIRY: int = 300
+    BULK_IMPORT_MAX_SIZE: int = 50 * 1024 * 1024
+    BULK_IMPORT_CHUNK_SIZE: int = 1000
+
+    # receipts partitioning, see app/db/partitions.py: "month" or "year" partitions, how many to create
+    # ahead of time, and the age at which a partition's category B-tree is swapped for a BRIN index
+    RECEIPTS_PARTITION_INTERVAL: str = "month"
+    RECEIPTS_PARTITIONS_AHEAD: int = 3
+    RECEIPTS_COMPACT_AFTER_MONTHS: int = 12
+
+    # Per-user response cache for the stats and expense list routes: "memory", "redis" or "none".
+    # "memory" is for a single API process; the OCR worker and other API workers can only invalidate redis.
+    CACHE_BACKEND: str = "memory"
+    CACHE_REDIS_URL: str | None = None
+    CACHE_TTL: int = 60
+    CACHE_MAX_ENTRIES: int = 10000
+    # uvicorn --workers count, which uvicorn itself also reads from this variable
+    WEB_CONCURRENCY: int = 1
+
+    # Statements at least this slow are logged and counted in db_slow_queries_total
+    SLOW_QUERY_MS: float = 200
+    # Sampling profiler: requests sending "X-Profile: <PROFILE_TOKEN>", plus a random PROFILE_SAMPLE_RATE share
+    PROFILE_TOKEN: str | None = None
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5
+    PROFILE_DIR: str = "/tmp/expensa-profiles"
+
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 8
+    PASSWORD_HASH_ACQUIRE_TIMEOUT: float = 0.1
+
+    @computed_field
+    @property
+    def ASYNC_DATABASE_URI(self) -> str:
+        return self.DATABASE_URI.replace("+psycopg2", "+asyncpg", 1)
+
 settings = Settings()
\ No newline at end of file
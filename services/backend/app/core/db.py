@@ -1,8 +1,173 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.core.config import settings
 
-engine = create_engine(str(settings.DATABASE_URI))
+
+def pool_status(pool) -> dict:
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "timeout": settings.DB_POOL_TIMEOUT,
+        "recycle": settings.DB_POOL_RECYCLE,
+        "pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+class PoolMetrics:
+    """Counters for the engine's connection pool plus request-side checkout latency"""
+
+    def __init__(self, samples: int = 1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self.checkouts = 0
+        self.connections_created = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_checkout(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.total_wait += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            total_wait = self.total_wait
+            counters = {
+                "checkouts": self.checkouts,
+                "connections_created": self.connections_created,
+                "invalidations": self.invalidations,
+                "checkout_timeouts": self.timeouts,
+            }
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        return {
+            "pool": pool_status(_engine.pool) if _engine else None,
+            **({"async_pool": pool_status(_async_engine.pool)} if _async_engine else {}),
+            **counters,
+            "total_wait_seconds": round(total_wait, 3),
+            "checkout_latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            },
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedPoolMixin:
+    """Times how long callers wait for a pooled connection, including opening new ones"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.incr("timeouts")
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.incr("checkouts")
+
+
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.incr("connections_created")
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.incr("invalidations")
+
+
+def _listen(sync_engine):
+    event.listen(sync_engine, "checkout", _on_checkout)
+    event.listen(sync_engine, "connect", _on_connect)
+    event.listen(sync_engine, "invalidate", _on_invalidate)
+
+
+# Engines are created on first use so importing the app stays cheap and the DB driver
+# (psycopg2, or asyncpg when DB_ASYNC is set) only loads once a request needs it.
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    str(settings.DATABASE_URI),
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT,
+                    pool_recycle=settings.DB_POOL_RECYCLE,
+                    pool_pre_ping=settings.DB_POOL_PRE_PING,
+                    poolclass=TimedQueuePool,
+                )
+                _listen(engine)
+                _engine = engine
+    return _engine
+
+
+def get_async_engine():
+    """asyncpg engine used by the async read routes; None unless DB_ASYNC is enabled"""
+    global _async_engine
+    if _async_engine is None and settings.DB_ASYNC:
+        with _engine_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+                engine = create_async_engine(
+                    settings.ASYNC_DATABASE_URI,
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT,
+                    pool_recycle=settings.DB_POOL_RECYCLE,
+                    pool_pre_ping=settings.DB_POOL_PRE_PING,
+                    poolclass=TimedAsyncAdaptedQueuePool,
+                )
+                _listen(engine.sync_engine)
+                _async_engine = engine
+    return _async_engine
+
 
 def get_session():
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    with Session(get_engine()) as session:
+        yield session
+
+
+async def get_async_session():
+    async with AsyncSession(get_async_engine()) as session:
+        yield session
@@ -2,6 +2,8 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import date
 
+CATEGORIES = ["food", "entertainment", "work"]
+
 class UpdateCreds(BaseModel):
     username: Optional[str]
     password: Optional[int]
@@ -12,3 +14,4 @@ class Expenses(BaseModel):
     category: str
     vendor: str
     amount: float
+    thumbnail: Optional[str] = None
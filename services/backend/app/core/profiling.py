@@ -0,0 +1,210 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+from app.core.db import pool_metrics
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start until the response is fully sent",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing SQL per request",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request; a route with a high count is a likely N+1",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ["route"])
+PROFILES = Counter("http_request_profiles_total", "Requests captured by the sampling profiler", ["route"])
+
+
+class PoolCollector:
+    """Exports the engine pool counters kept by app.core.db.pool_metrics"""
+
+    def collect(self):
+        snapshot = pool_metrics.snapshot()
+        # No pool until the first request has created the engine
+        for name in ("size", "checked_out", "overflow") if snapshot["pool"] else ():
+            gauge = GaugeMetricFamily(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}")
+            gauge.add_metric([], snapshot["pool"][name])
+            yield gauge
+        for name in ("checkouts", "connections_created", "invalidations", "checkout_timeouts"):
+            gauge = GaugeMetricFamily(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')} since start")
+            gauge.add_metric([], snapshot[name])
+            yield gauge
+
+
+REGISTRY.register(PoolCollector())
+
+
+class RequestStats:
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # Route templates keep label cardinality bounded; the router fills this in before the endpoint runs
+        return getattr(self.scope.get("route"), "path", "unmatched")
+
+
+# Set by ProfilingMiddleware; sync routes see it too because the threadpool copies the context
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        route = stats.route if stats else "background"
+        SLOW_QUERIES.labels(route=route).inc()
+        logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000, route, " ".join(statement.split())[:1000])
+
+
+# Listening on the Engine class covers both engines, including ones created after import
+event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SamplingProfiler:
+    """Samples Python stacks from a background thread while one request runs.
+
+    Only stacks that pass through this package are kept, so idle threads and the event loop's
+    selector drop out. Concurrent requests share threads with the profiled one, so busy servers
+    can mix their stacks in. Output is in the folded "frame;frame;frame count" format read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or code.co_filename.startswith(self._package_root)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if in_app:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, route: str) -> str:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+        path = os.path.join(settings.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{os.getpid()}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def should_profile(headers: dict) -> bool:
+    token = headers.get(b"x-profile")
+    if token is not None and settings.PROFILE_TOKEN and token.decode("latin-1") == settings.PROFILE_TOKEN:
+        return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """Per-route latency, DB query count and DB time for every HTTP request.
+
+    Timings cover the whole response, including streamed bodies. The response also carries a
+    Server-Timing header with the DB time and query count measured before it started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope)
+        token = _request_stats.set(stats)
+        profiler = None
+        if should_profile(dict(scope["headers"])):
+            profiler = SamplingProfiler(settings.PROFILE_INTERVAL_MS / 1000)
+            profiler.start()
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                server_timing = (
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}"
+                )
+                message.setdefault("headers", []).append((b"server-timing", server_timing.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            method = scope["method"]
+            REQUEST_SECONDS.labels(method=method, route=stats.route, status=str(status)).observe(elapsed)
+            REQUEST_DB_SECONDS.labels(method=method, route=stats.route).observe(stats.db_seconds)
+            REQUEST_DB_QUERIES.labels(method=method, route=stats.route).observe(stats.queries)
+            _request_stats.reset(token)
+
+            if profiler is not None:
+                profiler.stop()
+                PROFILES.labels(route=stats.route).inc()
+                try:
+                    path = profiler.dump(stats.route)
+                    logger.info("Profiled %s %s in %.1f ms: %s", method, stats.route, elapsed * 1000, path)
+                except Exception as e:
+                    logger.warning("Could not write profile for %s: %s", stats.route, e)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
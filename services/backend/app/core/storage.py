@@ -0,0 +1,56 @@
+import threading
+from app.core.config import settings
+
+# boto3 takes a few hundred milliseconds to import and build a client, so both happen on first use
+# rather than at startup. The client is thread-safe and shared by every request worker.
+_s3_client = None
+_transfer_config = None
+_lock = threading.Lock()
+
+# Object keys embed a fresh receipt_id, so an uploaded image never changes and can be cached for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        with _lock:
+            if _s3_client is None:
+                import boto3
+                _s3_client = boto3.client("s3", region_name=settings.REGION,
+                                          aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                                          aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                                          endpoint_url=settings.S3_ENDPOINT)
+    return _s3_client
+
+
+def get_transfer_config():
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNKSIZE,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+        )
+    return _transfer_config
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class LimitedReader:
+    """File wrapper that counts bytes as S3 reads them in parts and stops past `limit`"""
+
+    def __init__(self, fileobj, limit: int):
+        self.fileobj = fileobj
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.fileobj.read(size)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self.limit:
+            raise UploadTooLarge(f"File exceeds maximum upload size of {self.limit} bytes")
+        return chunk
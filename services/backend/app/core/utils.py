@@ -1,12 +1,95 @@
+import asyncio
 import bcrypt
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.core.config import settings
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# bcrypt is CPU bound, so it runs in worker processes instead of the request threadpool.
+# The semaphore caps how many requests may wait on the pool; the rest fail fast with PasswordHasherBusy.
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+
+
+def _get_executor(broken: ProcessPoolExecutor | None = None) -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor is broken:
+            # forkserver avoids forking the multi-threaded server process itself
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _executor
+
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=settings.PASSWORD_HASH_ACQUIRE_TIMEOUT):
+        raise PasswordHasherBusy("Too many concurrent password operations")
+    try:
+        executor = _get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM killed); replace the pool once and retry
+            return _get_executor(broken=executor).submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+async def _run_async(fn, *args):
+    """_run for the event loop: polls for a slot and awaits the pool future without holding a thread"""
+    deadline = time.monotonic() + settings.PASSWORD_HASH_ACQUIRE_TIMEOUT
+    while not _slots.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            raise PasswordHasherBusy("Too many concurrent password operations")
+        await asyncio.sleep(0.01)
+    try:
+        executor = _get_executor()
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            return await asyncio.wrap_future(_get_executor(broken=executor).submit(fn, *args))
+    finally:
+        _slots.release()
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password=password, salt=bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password: bytes, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password=password, hashed_password=hashed_password)
+
 
 def hash_password(password: str) -> str:
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password=pwd_bytes, salt=salt)
+    hashed = _run(_hashpw, pwd_bytes, settings.BCRYPT_ROUNDS)
     return hashed.decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_byte_enc = plain_password.encode('utf-8')
     hashed_password_enc = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password=password_byte_enc, hashed_password=hashed_password_enc)
\ No newline at end of file
+    return _run(_checkpw, password_byte_enc, hashed_password_enc)
+
+async def hash_password_async(password: str) -> str:
+    hashed = await _run_async(_hashpw, password.encode('utf-8'), settings.BCRYPT_ROUNDS)
+    return hashed.decode('utf-8')
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_async(_checkpw, plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when the hash was made with a different cost than BCRYPT_ROUNDS ($2b$<cost>$...)"""
+    try:
+        return int(hashed_password.split('$')[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
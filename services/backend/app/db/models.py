@@ -1,9 +1,13 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy.dialects.postgresql import UUID
 from pydantic import BaseModel
 from datetime import date
 
+# ids are UUID columns in Postgres but handled as plain strings in Python
+UUIDStr = UUID(as_uuid=False)
+
 class users(SQLModel, table=True):
-    user_id: str = Field(primary_key=True)
+    user_id: str = Field(primary_key=True, sa_type=UUIDStr)
     email: str = Field(index=True, unique=True)
     username: str
     password: str
@@ -19,13 +23,30 @@ class LoginRequest(BaseModel):
     password: str
 
 class receipts(SQLModel, table=True):
-    receipt_id: str = Field(primary_key=True)
+    receipt_id: str = Field(primary_key=True, sa_type=UUIDStr)
     category: str
     receipt_date: date
     vendor_name: str
     total_amount: float
     s3_url: str | None
-    user_id: str = Field(index=True)
+    user_id: str = Field(index=True, sa_type=UUIDStr)
+    # Set from vendor_name by the trg_receipts_vendor_key trigger, see deployment/tables.sql
+    vendor_key: str | None = Field(default=None)
+    # Written by the OCR worker next to the original at s3_url
+    thumbnail_url: str | None = Field(default=None)
+
+class vendor_aliases(SQLModel, table=True):
+    alias: str = Field(primary_key=True)
+    vendor_name: str
+
+class monthly_expenses(SQLModel, table=True):
+    # Maintained by the trg_receipts_monthly_expenses trigger, see deployment/tables.sql
+    user_id: str = Field(primary_key=True, sa_type=UUIDStr)
+    year: int = Field(primary_key=True)
+    month: int = Field(primary_key=True)
+    category: str = Field(primary_key=True)
+    total_amount: float = Field(default=0)
+    receipt_count: int = Field(default=0)
 
 class CreateReceipt(BaseModel):
     category: str
@@ -0,0 +1,92 @@
+import argparse
+from datetime import date
+from sqlmodel import Session, text
+from app.core.config import settings
+from app.core.db import get_engine
+
+
+def months_before(months: int, today: date | None = None) -> date:
+    """First day of the month `months` months before the current one"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _call(statement: str, **params) -> list:
+    with Session(get_engine()) as session:
+        rows = session.execute(text(statement).bindparams(**params)).all()
+        session.commit()
+        return rows
+
+
+def migrate(interval: str | None = None) -> int:
+    """Move an unpartitioned receipts table into range partitions, keeping the old one as receipts_unpartitioned"""
+    interval = interval or settings.RECEIPTS_PARTITION_INTERVAL
+    return _call("SELECT migrate_receipts_to_partitions(:interval)", interval=interval)[0][0]
+
+
+def maintain(interval: str | None = None, ahead: int | None = None,
+             compact_after_months: int | None = None) -> tuple[list[str], list[str]]:
+    """Create upcoming partitions, drain recent periods out of receipts_default and move old partitions onto BRIN indexes.
+
+    Rows in receipts_default dated before the compaction age or after the periods created ahead are left there.
+    """
+    interval = interval or settings.RECEIPTS_PARTITION_INTERVAL
+    ahead = settings.RECEIPTS_PARTITIONS_AHEAD if ahead is None else ahead
+    if compact_after_months is None:
+        compact_after_months = settings.RECEIPTS_COMPACT_AFTER_MONTHS
+
+    compact_before = months_before(compact_after_months)
+    created = _call(
+        "SELECT * FROM ensure_receipts_partitions(:interval, :ahead, :since)",
+        interval=interval, ahead=ahead, since=compact_before,
+    )
+    compacted = _call("SELECT * FROM compact_receipts_partitions(:before)", before=compact_before)
+    return [name for name, in created], [name for name, in compacted]
+
+
+def archive(older_than_months: int, schema: str = "receipts_archive") -> list[str]:
+    """Detach partitions that ended more than older_than_months ago into the given schema"""
+    archived = _call(
+        "SELECT * FROM archive_receipts_partitions(:before, :schema)",
+        before=months_before(older_than_months), schema=schema,
+    )
+    return [name for name, in archived]
+
+
+def status() -> list:
+    return _call("SELECT * FROM receipts_partitions()")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the receipt_date partitions of the receipts table")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Convert an unpartitioned receipts table")
+    migrate_parser.add_argument("--interval", choices=["month", "year"])
+
+    maintain_parser = commands.add_parser("maintain", help="Create upcoming partitions and compact old ones")
+    maintain_parser.add_argument("--interval", choices=["month", "year"])
+    maintain_parser.add_argument("--ahead", type=int, help="Periods to create beyond the current one")
+    maintain_parser.add_argument("--compact-after-months", type=int, help="Age at which partitions get BRIN indexes")
+
+    archive_parser = commands.add_parser("archive", help="Detach old partitions into an archive schema")
+    archive_parser.add_argument("--older-than-months", type=int, required=True)
+    archive_parser.add_argument("--schema", default="receipts_archive")
+
+    commands.add_parser("status", help="List partitions with their bounds and estimated row counts")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(f"Copied {migrate(args.interval)} receipt(s) into the partitioned table")
+    elif args.command == "maintain":
+        created, compacted = maintain(args.interval, args.ahead, args.compact_after_months)
+        print(f"Created {len(created)} partition(s): {', '.join(created) or '-'}")
+        print(f"Compacted {len(compacted)} partition(s): {', '.join(compacted) or '-'}")
+    elif args.command == "archive":
+        archived = archive(args.older_than_months, args.schema)
+        print(f"Archived {len(archived)} partition(s): {', '.join(archived) or '-'}")
+    else:
+        for name, lower, upper, rows, compacted in status():
+            bounds = f"{lower} .. {upper}" if lower else "default"
+            print(f"{name:<24} {bounds:<26} ~{rows} rows{' (brin)' if compacted else ''}")
@@ -0,0 +1,22 @@
+import argparse
+from sqlmodel import Session, text
+from app.core.db import get_engine
+
+
+def rebuild_monthly_expenses(user_id: str | None = None) -> int:
+    """Recompute the monthly_expenses rollup from receipts, for one user or all users"""
+    with Session(get_engine()) as session:
+        rebuilt = session.execute(
+            text("SELECT rebuild_monthly_expenses(CAST(:user_id AS UUID))").bindparams(user_id=user_id)
+        ).scalar_one()
+        session.commit()
+        return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the monthly_expenses rollup table from receipts")
+    parser.add_argument("--user-id", help="Only rebuild rows for this user")
+    args = parser.parse_args()
+
+    rows = rebuild_monthly_expenses(args.user_id)
+    print(f"Rebuilt {rows} monthly_expenses row(s)")
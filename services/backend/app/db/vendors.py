@@ -0,0 +1,37 @@
+import argparse
+from sqlmodel import Session, text
+from app.core.db import get_engine
+
+
+def _call(statement: str, **params) -> int:
+    with Session(get_engine()) as session:
+        result = session.execute(text(statement).bindparams(**params)).scalar_one()
+        session.commit()
+        return result
+
+
+def add_alias(alias: str, vendor_name: str) -> int:
+    """Group receipts whose vendor reads as alias under vendor_name; returns the receipts rekeyed"""
+    return _call("SELECT add_vendor_alias(:alias, :vendor_name)", alias=alias, vendor_name=vendor_name)
+
+
+def rebuild_vendor_keys() -> int:
+    """Recompute receipts.vendor_key from vendor_name and vendor_aliases; returns the receipts changed"""
+    return _call("SELECT rebuild_vendor_keys()")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage vendor name normalization for search and grouping")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    alias_parser = commands.add_parser("alias", help="Group a vendor name as read under a canonical name")
+    alias_parser.add_argument("alias", help='Vendor name as stored on receipts, e.g. "STARBUCKS #1234"')
+    alias_parser.add_argument("vendor_name", help='Canonical name, e.g. "Starbucks"')
+
+    commands.add_parser("rebuild", help="Recompute vendor_key for every receipt")
+    args = parser.parse_args()
+
+    if args.command == "alias":
+        print(f"Rekeyed {add_alias(args.alias, args.vendor_name)} receipt(s) to {args.vendor_name}")
+    else:
+        print(f"Rekeyed {rebuild_vendor_keys()} receipt(s)")
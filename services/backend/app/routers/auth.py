@@ -1,15 +1,42 @@
+from contextlib import contextmanager, suppress
 from fastapi import APIRouter, HTTPException, Form
-from app.core.utils import hash_password, verify_password
-from app.db.models import UserCreate, LoginRequest, users, receipts
-from sqlmodel import select, extract, func
-from app.routers.deps import SessionDep
-from datetime import datetime
+from app.core.config import settings
+from app.core.utils import hash_password, verify_password, hash_password_async, verify_password_async, needs_rehash, PasswordHasherBusy
+from app.db.models import UserCreate, LoginRequest, users, monthly_expenses
+from sqlmodel import select, update, func
+from sqlalchemy import bindparam
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.routers.deps import SessionDep, AsyncSessionDep, pool_exhausted, db_errors
+from datetime import date
 from uuid import uuid4
 
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
+def hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many concurrent authentication requests, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+@contextmanager
+def auth_errors(action: str):
+    """db_errors plus the 503 for a saturated password hashing pool"""
+    with db_errors(action):
+        try:
+            yield
+        except PasswordHasherBusy:
+            raise hasher_busy()
+
+
+def check_credentials(valid: bool):
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+
 def get_user_by_email(email: str, session: SessionDep) -> users | None:
     statement = select(users).where(users.email == email)
     session_user = session.exec(statement).first()
@@ -28,6 +55,10 @@ def get_user_by_email(email: str, session: SessionDep) -> users | None:
             "description": "User already exists",
             "content": {"application/json": {"example": {"detail": "User already exists"}}},
         },
+        503: {
+            "description": "Password hashing capacity exhausted",
+            "content": {"application/json": {"example": {"detail": "Too many concurrent authentication requests, retry shortly"}}},
+        },
         500: {
             "description": "Server error during user registration",
             "content": {"application/json": {"example": {"detail": "Error registering user: ERROR"}}},
@@ -35,7 +66,6 @@ def get_user_by_email(email: str, session: SessionDep) -> users | None:
     },
 )
 def register_user(session: SessionDep, user: UserCreate = Form(...)):
-    hashed_password = hash_password(user.password)
     uid = str(uuid4())
     try:
         existing_user = get_user_by_email(email=user.email, session=session)
@@ -45,6 +75,7 @@ def register_user(session: SessionDep, user: UserCreate = Form(...)):
                 detail="User already exists",
             )
 
+        hashed_password = hash_password(user.password)
         new_user = users(
             user_id=uid,
             email=user.email,
@@ -54,12 +85,55 @@ def register_user(session: SessionDep, user: UserCreate = Form(...)):
         session.add(new_user)
         session.commit()
         return {"message": "User registered successfully", "user_id": uid, "username": user.username}
+    except HTTPException:
+        raise
+    except PasswordHasherBusy:
+        raise hasher_busy()
+    except PoolTimeoutError:
+        raise pool_exhausted()
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=f"Error registering user: {e}")
 
 
-@router.post(
+# Login statements are built once and bound per request; only the hash and id are read until the password checks out
+credentials_query = select(users.user_id, users.password).where(users.email == bindparam("email"))
+
+current_month_spend = (
+    select(func.coalesce(func.sum(monthly_expenses.total_amount), 0))
+    .where(
+        monthly_expenses.user_id == users.user_id,
+        monthly_expenses.year == bindparam("year"),
+        monthly_expenses.month == bindparam("month"),
+    )
+    .scalar_subquery()
+)
+
+profile_query = select(users.username, users.budget, current_month_spend).where(users.user_id == bindparam("user_id"))
+
+
+def profile_params(user_id: str) -> dict:
+    today = date.today()
+    return {"user_id": user_id, "year": today.year, "month": today.month}
+
+
+def rehash_statement(user_id: str, hashed_password: str):
+    return update(users).where(users.user_id == user_id).values(password=hashed_password)
+
+
+def login_response(user_id: str, profile) -> dict:
+    username, budget, expenditure = profile
+
+    return {
+        "message": "Login successful",
+        "user_id": user_id,
+        "username": username,
+        "budget": float(budget),
+        "expenditure": float(expenditure),
+    }
+
+
+login_user_route = router.post(
     "/login",
     summary="Authenticate user and return user_id with current month expenditure",
     responses={
@@ -81,42 +155,48 @@ def register_user(session: SessionDep, user: UserCreate = Form(...)):
             "description": "Invalid credentials",
             "content": {"application/json": {"example": {"detail": "Invalid credentials"}}},
         },
+        503: {
+            "description": "Password hashing capacity exhausted",
+            "content": {"application/json": {"example": {"detail": "Too many concurrent authentication requests, retry shortly"}}},
+        },
         500: {
             "description": "Server error during login",
             "content": {"application/json": {"example": {"detail": "Error logging in: some error"}}},
         },
     },
 )
+
+
 def login_user(session: SessionDep, loginrequest: LoginRequest = Form(...)):
-    try:
+    with auth_errors("Error logging in"):
         # Validate user credentials
-        credentials = session.exec(
-            select(users).where(users.email == loginrequest.email)
-        ).first()
+        credentials = session.exec(credentials_query, params={"email": loginrequest.email}).first()
+        check_credentials(credentials and verify_password(loginrequest.password, credentials.password))
 
-        if not credentials or not verify_password(loginrequest.password, credentials.password):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        # Upgrade hashes made with an older cost factor while the plain password is at hand
+        if needs_rehash(credentials.password):
+            with suppress(PasswordHasherBusy):
+                session.exec(rehash_statement(credentials.user_id, hash_password(loginrequest.password)))
+                session.commit()
 
-        current_month = datetime.now().month
+        profile = session.exec(profile_query, params=profile_params(credentials.user_id)).one()
+        return login_response(credentials.user_id, profile)
 
-        # Query sum of expenses for current month
-        expenditure = session.exec(
-            select(func.sum(receipts.total_amount))
-            .where(
-                receipts.user_id == credentials.user_id,
-                extract("month", receipts.receipt_date) == current_month
-            )
-        ).one()
 
-        total_expenditure = expenditure or 0
+async def login_user_async(session: AsyncSessionDep, loginrequest: LoginRequest = Form(...)):
+    with auth_errors("Error logging in"):
+        # Validate user credentials
+        credentials = (await session.exec(credentials_query, params={"email": loginrequest.email})).first()
+        check_credentials(credentials and await verify_password_async(loginrequest.password, credentials.password))
 
-        return {
-            "message": "Login successful",
-            "user_id": credentials.user_id,
-            "username": credentials.username,
-            "budget": float(credentials.budget),
-            "expenditure": float(total_expenditure),
-        }
+        # Upgrade hashes made with an older cost factor while the plain password is at hand
+        if needs_rehash(credentials.password):
+            with suppress(PasswordHasherBusy):
+                await session.exec(rehash_statement(credentials.user_id, await hash_password_async(loginrequest.password)))
+                await session.commit()
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error logging in: {e}")
+        profile = (await session.exec(profile_query, params=profile_params(credentials.user_id))).one()
+        return login_response(credentials.user_id, profile)
+
+
+login_user_route(login_user_async if settings.DB_ASYNC else login_user)
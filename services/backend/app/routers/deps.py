@@ -1,6 +1,35 @@
+from contextlib import contextmanager
 from typing import Annotated
-from fastapi import Depends
+from fastapi import Depends, HTTPException
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlmodel import Session
-from app.core.db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.db import get_session, get_async_session
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
+
+def pool_exhausted() -> HTTPException:
+    """503 for a request that timed out waiting for a pooled DB connection (sqlalchemy.exc.TimeoutError)"""
+    return HTTPException(
+        status_code=503,
+        detail="Database connection pool exhausted",
+        headers={"Retry-After": "1"},
+    )
+
+
+@contextmanager
+def db_errors(action: str):
+    """Map failures inside a route body to responses: HTTPExceptions pass through, pool timeouts are 503, the rest 500.
+
+    Shared by the sync and async variants of a route so they differ only in how statements are executed.
+    """
+    try:
+        yield
+    except HTTPException:
+        raise
+    except PoolTimeoutError:
+        raise pool_exhausted()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{action}: {e}")
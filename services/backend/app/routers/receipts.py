@@ -1,43 +1,154 @@
-from fastapi import APIRouter, HTTPException, UploadFile, Form
-from typing import List, Dict
-from app.db.models import receipts, CreateReceipt, users
-from app.routers.deps import SessionDep
+from fastapi import APIRouter, HTTPException, UploadFile, Form, Query, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Callable, List, Dict, Optional
+from app.db.models import receipts, CreateReceipt, users, monthly_expenses, vendor_aliases
+from app.routers.deps import SessionDep, AsyncSessionDep, pool_exhausted, db_errors
+from app.core.db import get_engine, get_async_engine
 from app.core.config import settings
-from app.core.models import UpdateCreds, Expenses
-import boto3
+from app.core.cache import response_cache
+from app.core.models import UpdateCreds, Expenses, CATEGORIES
+from app.core.bulk_import import import_receipts
+from app.core.storage import get_s3_client, get_transfer_config, LimitedReader, UploadTooLarge, IMMUTABLE_CACHE_CONTROL
 from botocore.exceptions import NoCredentialsError
-from uuid import uuid4
-from sqlmodel import select, extract, func
-from datetime import datetime
-from calendar import month_name
+from uuid import uuid4, UUID
+from sqlmodel import select, func, tuple_, Session, String
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from datetime import datetime, date
+from calendar import month_name, month_abbr
+import base64
+import orjson
+import logging
+import tempfile
+import time
 
 router = APIRouter(prefix="/receipts", tags=["Receipts"])
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = 500
+IMPORT_FORMATS = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+
+
+def encode_cursor(receipt_date: date, receipt_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{receipt_date.isoformat()},{receipt_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[date, str]:
+    try:
+        receipt_date, receipt_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(",", 1)
+        return date.fromisoformat(receipt_date), str(UUID(receipt_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def format_expense(receipt_date: date, category: str, vendor_name: str, total_amount, thumbnail_url: Optional[str]) -> dict:
+    return {
+        # Same text as strftime("%b %d, %Y") without a strftime call per row
+        "date": f"{month_abbr[receipt_date.month]} {receipt_date.day:02d}, {receipt_date.year}",
+        "category": category,
+        "vendor": vendor_name,
+        "amount": float(total_amount),
+        "thumbnail": thumbnail_url,
+    }
 
 
 @router.post(
     "/uploadExpenses",
     summary="Upload receipt to S3 and store metadata",
     responses={
-        201: {"description": "Successful Upload", "content": {"application/json": {"example": {"message": "Successful Upload", "File": "unique_key.jpeg"}}}},
+        201: {"description": "Successful Upload", "content": {"application/json": {"example": {"message": "Successful Upload", "File": "unique_key.jpeg", "size": 1048576, "elapsed_ms": 120.5, "throughput_mbps": 8.3}}}},
         400: {"description": "Invalid category"},
         401: {"description": "AWS credentials not found"},
+        413: {"description": "File exceeds maximum upload size"},
     },
 )
 def upload_receipt(file: UploadFile, user_id: str = Form(...), category: str = Form(...)):
-    if category not in ["food", "entertainment", "work"]:
+    if category not in CATEGORIES:
         raise HTTPException(status_code=400, detail="Invalid category")
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes")
 
     try:
-        s3_client = boto3.client("s3", region_name=settings.REGION,
-                                  aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                                  endpoint_url=settings.S3_ENDPOINT)
         receipt_id = str(uuid4())
         key = f"{receipt_id}_{file.filename}"
-        metadata = {'Metadata': {'category': category, 'user': user_id}, 'ACL': 'public-read'}
+        metadata = {'Metadata': {'category': category, 'user': user_id}, 'ACL': 'public-read',
+                    'CacheControl': IMMUTABLE_CACHE_CONTROL}
+
+        # Stream the upload to S3 in parts instead of reading the whole file into memory
+        reader = LimitedReader(file.file, settings.MAX_UPLOAD_SIZE)
+        start = time.perf_counter()
+        get_s3_client().upload_fileobj(reader, settings.S3_BUCKET, key, ExtraArgs=metadata, Config=get_transfer_config())
+        elapsed = time.perf_counter() - start
+
+        throughput = reader.bytes_read / elapsed / 1_000_000 if elapsed else 0.0
+        logger.info("Uploaded %s (%d bytes) in %.1f ms, %.2f MB/s", key, reader.bytes_read, elapsed * 1000, throughput)
+        return {
+            "message": "Uploaded successfully",
+            "File": key,
+            "size": reader.bytes_read,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "throughput_mbps": round(throughput, 2),
+        }
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except NoCredentialsError:
+        raise HTTPException(status_code=401, detail="AWS credentials not found")
+
+
+@router.post(
+    "/presignUpload",
+    summary="Get a presigned POST policy to upload a receipt directly to S3",
+    responses={
+        201: {
+            "description": "Presigned upload created",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Presigned upload created",
+                        "File": "unique_key.jpeg",
+                        "url": "https://bucket.s3.amazonaws.com/",
+                        "fields": {"key": "unique_key.jpeg", "Cache-Control": "public, max-age=31536000, immutable", "x-amz-meta-category": "food", "x-amz-meta-user": "uuid"},
+                        "expires_in": 300,
+                    }
+                }
+            },
+        },
+        400: {"description": "Invalid category"},
+        401: {"description": "AWS credentials not found"},
+    },
+)
+def presign_upload(filename: str = Form(...), user_id: str = Form(...), category: str = Form(...)):
+    if category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid category")
+
+    try:
+        receipt_id = str(uuid4())
+        key = f"{receipt_id}_{filename}"
+        # The client must send these fields unchanged so the OCR worker sees the same metadata as uploadExpenses
+        fields = {
+            "acl": "public-read",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "x-amz-meta-category": category,
+            "x-amz-meta-user": user_id,
+        }
+        conditions = [{name: value} for name, value in fields.items()]
+        conditions.append(["content-length-range", 1, settings.MAX_UPLOAD_SIZE])
 
-        s3_client.upload_fileobj(file.file, settings.S3_BUCKET, key, ExtraArgs=metadata)
-        return {"message": "Uploaded successfully", "File": key}
+        presigned = get_s3_client().generate_presigned_post(
+            settings.S3_BUCKET,
+            key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=settings.PRESIGNED_URL_EXPIRY,
+        )
+        return {
+            "message": "Presigned upload created",
+            "File": key,
+            "url": presigned["url"],
+            "fields": presigned["fields"],
+            "expires_in": settings.PRESIGNED_URL_EXPIRY,
+        }
     except NoCredentialsError:
         raise HTTPException(status_code=401, detail="AWS credentials not found")
 
@@ -64,11 +175,77 @@ def create_expenses(session: SessionDep, user_id: str = Form(...), record: Creat
         )
         session.add(new_expense)
         session.commit()
+        response_cache.invalidate(user_id)
         return {"message": "Successfully created expense record"}
+    except PoolTimeoutError:
+        raise pool_exhausted()
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=f"CREATE operation error: {e}")
 
+@router.post(
+    "/bulkImport",
+    summary="Import many expense records from a CSV or NDJSON request body",
+    responses={
+        200: {
+            "description": "Import finished; invalid rows are skipped and reported",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Import complete",
+                        "rows": 3,
+                        "imported": 2,
+                        "failed": 1,
+                        "errors": [{"row": 2, "errors": ["total_amount: Input should be a valid number"]}],
+                        "elapsed_ms": 12.5,
+                        "rows_per_second": 240.0,
+                    }
+                }
+            },
+        },
+        413: {"description": "Import exceeds maximum size"},
+        415: {"description": "Unsupported content type, use text/csv or application/x-ndjson"},
+        500: {"description": "IMPORT operation error"},
+    },
+)
+async def bulk_import(request: Request, user_id: str = Query(...)):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    fmt = IMPORT_FORMATS.get(content_type)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Unsupported content type, use text/csv or application/x-ndjson")
+
+    # Spool the streamed body (to disk past 8 MB), then validate and COPY it off the event loop
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as body:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.BULK_IMPORT_MAX_SIZE:
+                raise HTTPException(status_code=413, detail=f"Import exceeds maximum size of {settings.BULK_IMPORT_MAX_SIZE} bytes")
+            body.write(chunk)
+        body.seek(0)
+
+        try:
+            result = await run_in_threadpool(copy_import, body, fmt, user_id)
+        except PoolTimeoutError:
+            raise pool_exhausted()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"IMPORT operation error: {e}")
+
+    if result["imported"]:
+        response_cache.invalidate(user_id)
+    logger.info("Imported %d/%d rows for %s in %.1f ms, %.0f rows/s",
+                result["imported"], result["rows"], user_id, result["elapsed_ms"], result["rows_per_second"])
+    return result
+
+
+def copy_import(body, fmt: str, user_id: str) -> dict:
+    connection = get_engine().raw_connection()
+    try:
+        return import_receipts(connection, body, fmt, user_id, settings.BULK_IMPORT_CHUNK_SIZE)
+    finally:
+        connection.close()
+
+
 @router.put(
     "/updateBudget",
     summary="Update the user's budget",
@@ -92,7 +269,10 @@ def update_budget(session: SessionDep, user_id: str = Form(...), budget: float =
             raise HTTPException(status_code=401, detail="Invalid credentials")
         details.budget = budget
         session.commit()
+        response_cache.invalidate(user_id)
         return {"message": "Budget updated successfully", "budget": budget}
+    except PoolTimeoutError:
+        raise pool_exhausted()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating budget: {e}")
 
@@ -124,41 +304,340 @@ def update_credentials(session: SessionDep, user_id: str = Form(...), request: U
             setattr(details, field, value)
         session.commit()
         return {"message": "Credentials updated successfully"}
+    except PoolTimeoutError:
+        raise pool_exhausted()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating credentials: {e}")
     
 
-@router.get(
+class ReadPlan:
+    """Everything a cached read route does apart from executing its statement.
+
+    render turns the fetched rows into (content, headers). The sync and async variants of each route
+    build the same plan and hand it to run_read / run_read_async.
+    """
+
+    def __init__(self, user_id: str, endpoint: str, statement, render: Callable[[list], tuple[list, dict]]):
+        self.user_id = user_id
+        self.endpoint = endpoint
+        self.statement = statement
+        self.render = render
+
+
+def run_read(plan: ReadPlan, session: Session, request: Request):
+    slot, cached = response_cache.lookup(request, plan.user_id, plan.endpoint)
+    if cached:
+        return cached
+    with db_errors("READ operation error"):
+        content, headers = plan.render(session.exec(plan.statement).all())
+    return response_cache.store(plan.user_id, slot, content, headers)
+
+
+async def run_read_async(plan: ReadPlan, session: AsyncSession, request: Request):
+    slot, cached = response_cache.lookup(request, plan.user_id, plan.endpoint)
+    if cached:
+        return cached
+    with db_errors("READ operation error"):
+        content, headers = plan.render((await session.exec(plan.statement)).all())
+    return response_cache.store(plan.user_id, slot, content, headers)
+
+
+def expenses_statement(user_id: str, after: Optional[tuple[date, str]], start_date: Optional[date],
+                       end_date: Optional[date], category: Optional[str]):
+    # Keyset pagination on (receipt_date, receipt_id) so every page is an index range scan on idx_user_date
+    statement = (
+        select(receipts.receipt_date, receipts.category, receipts.vendor_name, receipts.total_amount,
+               receipts.thumbnail_url, receipts.receipt_id)
+        .where(receipts.user_id == user_id)
+        .order_by(receipts.receipt_date.desc(), receipts.receipt_id.desc())
+    )
+    if start_date:
+        statement = statement.where(receipts.receipt_date >= start_date)
+    if end_date:
+        statement = statement.where(receipts.receipt_date <= end_date)
+    if category:
+        statement = statement.where(receipts.category == category)
+    if after:
+        statement = statement.where(tuple_(receipts.receipt_date, receipts.receipt_id) < after)
+    return statement
+
+
+def page_expenses(expenses, limit: Optional[int]) -> tuple[List[dict], dict]:
+    headers = {}
+    if limit and len(expenses) > limit:
+        expenses = expenses[:limit]
+        last = expenses[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last.receipt_date, last.receipt_id)
+
+    # Rows are plain tuples and the dicts already have the Expenses shape, so no per-row model is built
+    content = [
+        format_expense(receipt_date, category, vendor_name, total_amount, thumbnail_url)
+        for receipt_date, category, vendor_name, total_amount, thumbnail_url, _ in expenses
+    ]
+    return content, headers
+
+
+def expense_line(receipt_date, category, vendor_name, total_amount, thumbnail_url, _receipt_id) -> bytes:
+    # Encoded like the JSON response (orjson, UTF-8 as is), one object per line
+    return orjson.dumps(format_expense(receipt_date, category, vendor_name, total_amount, thumbnail_url)) + b"\n"
+
+
+def stream_expenses(statement):
+    """Yield NDJSON lines from a server-side cursor so memory stays flat regardless of history size"""
+    with Session(get_engine()) as session:
+        rows = session.exec(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for row in rows:
+            yield expense_line(*row)
+
+
+async def stream_expenses_async(statement):
+    """stream_expenses on the asyncpg engine"""
+    async with AsyncSession(get_async_engine()) as session:
+        rows = await session.stream(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for row in rows:
+            yield expense_line(*row)
+
+
+get_expenses_route = router.get(
     "/getExpenses/{user_id}",
-    summary="Get all expenses for a user",
+    summary="Get expenses for a user, newest first, optionally paginated, filtered or streamed",
     response_model=List[Expenses],
     responses={
-        200: {"description": "Successfully fetched list of user expense records"},
+        200: {
+            "description": "Successfully fetched list of user expense records. "
+                           "thumbnail is the URL of a small preview of the receipt image, null until the OCR worker has made one. "
+                           "When more rows are available the X-Next-Cursor header holds the cursor for the next page. "
+                           "With format=ndjson the rows are streamed one JSON object per line.",
+        },
+        400: {"description": "Invalid cursor"},
         500: {"description": "READ operation error"},
     },
 )
-def get_expenses(user_id: str, session: SessionDep):
-    try:
-        expenses = session.exec(
-            select(receipts).where(receipts.user_id == user_id)
-        ).all()
-
-        results = [
-            Expenses(
-                date=expense.receipt_date.strftime("%b %d, %Y"),
-                category=expense.category,
-                vendor=expense.vendor_name,
-                amount=float(expense.total_amount),
-            )
-            for expense in expenses
-        ]
-
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"READ operation error: {e}")
 
 
-@router.get(
+class ExpensesQuery:
+    """Statement for a getExpenses request; plan is None when the rows are streamed as NDJSON"""
+
+    def __init__(self, statement, plan: Optional[ReadPlan]):
+        self.statement = statement
+        self.plan = plan
+
+
+# The plan dependencies are async so FastAPI calls them on the event loop instead of the threadpool;
+# they only build statements
+async def expenses_query(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of rows to return"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    start_date: Optional[date] = Query(None, description="Only receipts on or after this date"),
+    end_date: Optional[date] = Query(None, description="Only receipts on or before this date"),
+    category: Optional[str] = Query(None, description="Only receipts in this category"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json, or ndjson to stream rows"),
+) -> ExpensesQuery:
+    after = decode_cursor(cursor) if cursor else None
+    statement = expenses_statement(user_id, after, start_date, end_date, category)
+
+    if format == "ndjson":
+        return ExpensesQuery(statement.limit(limit) if limit else statement, None)
+
+    # One row past the page tells whether there is a next one
+    if limit:
+        statement = statement.limit(limit + 1)
+    return ExpensesQuery(statement, ReadPlan(user_id, "expenses", statement, lambda rows: page_expenses(rows, limit)))
+
+
+ExpensesQueryDep = Annotated[ExpensesQuery, Depends(expenses_query)]
+
+
+def get_expenses(query: ExpensesQueryDep, session: SessionDep, request: Request):
+    if query.plan is None:
+        return StreamingResponse(stream_expenses(query.statement), media_type="application/x-ndjson")
+    return run_read(query.plan, session, request)
+
+
+async def get_expenses_async(query: ExpensesQueryDep, session: AsyncSessionDep, request: Request):
+    if query.plan is None:
+        return StreamingResponse(stream_expenses_async(query.statement), media_type="application/x-ndjson")
+    return await run_read_async(query.plan, session, request)
+
+
+get_expenses_route(get_expenses_async if settings.DB_ASYNC else get_expenses)
+
+
+VENDOR_MATCHES = "^(fuzzy|prefix|substring)$"
+
+
+def vendor_condition(q: str, match: str):
+    """Filter on receipts.vendor_key, normalizing the search term the same way as the stored keys.
+
+    prefix and substring are LIKE patterns and fuzzy is pg_trgm word similarity; all three can use
+    idx_receipts_vendor_trgm. The normalized term holds no LIKE wildcards.
+    """
+    if not any(c.isalnum() for c in q):
+        raise HTTPException(status_code=400, detail="Search term must contain a letter or digit")
+    term = func.normalize_vendor(q, type_=String)
+    if match == "fuzzy":
+        return term.op("<%")(receipts.vendor_key), func.word_similarity(term, receipts.vendor_key)
+    if match == "prefix":
+        return receipts.vendor_key.like(term + "%"), None
+    return receipts.vendor_key.like("%" + term + "%"), None
+
+
+def search_statement(user_id: str, q: str, match: str, start_date: Optional[date], end_date: Optional[date],
+                     category: Optional[str], limit: int):
+    condition, similarity = vendor_condition(q, match)
+    statement = expenses_statement(user_id, None, start_date, end_date, category).where(condition).limit(limit)
+    if similarity is not None:
+        # Closest matches first, newest first among equally close ones
+        statement = statement.order_by(None).order_by(
+            similarity.desc(), receipts.receipt_date.desc(), receipts.receipt_id.desc()
+        )
+    return statement
+
+
+search_expenses_route = router.get(
+    "/search/{user_id}",
+    summary="Search a user's expenses by vendor, optionally filtered by date range and category",
+    response_model=List[Expenses],
+    responses={
+        200: {
+            "description": "Matching expense records, newest first; with match=fuzzy the closest vendors come first",
+        },
+        400: {"description": "Search term has no letters or digits"},
+        500: {"description": "READ operation error"},
+    },
+)
+
+
+async def search_plan(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=100, description="Vendor name, or part of it"),
+    match: str = Query("substring", pattern=VENDOR_MATCHES, description="fuzzy, prefix or substring"),
+    start_date: Optional[date] = Query(None, description="Only receipts on or after this date"),
+    end_date: Optional[date] = Query(None, description="Only receipts on or before this date"),
+    category: Optional[str] = Query(None, description="Only receipts in this category"),
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of rows to return"),
+) -> ReadPlan:
+    statement = search_statement(user_id, q, match, start_date, end_date, category, limit)
+    return ReadPlan(user_id, "search", statement, lambda rows: page_expenses(rows, None))
+
+
+SearchPlanDep = Annotated[ReadPlan, Depends(search_plan)]
+
+
+def search_expenses(plan: SearchPlanDep, session: SessionDep, request: Request):
+    return run_read(plan, session, request)
+
+
+async def search_expenses_async(plan: SearchPlanDep, session: AsyncSessionDep, request: Request):
+    return await run_read_async(plan, session, request)
+
+
+search_expenses_route(search_expenses_async if settings.DB_ASYNC else search_expenses)
+
+
+def vendor_suggestions_statement(user_id: str, q: str, match: str, limit: int):
+    condition, similarity = vendor_condition(q, match)
+    # Aggregate per vendor_key first so the alias join runs once per vendor rather than once per receipt
+    vendors = (
+        select(
+            receipts.vendor_key,
+            func.max(receipts.vendor_name).label("vendor_name"),
+            func.count().label("receipts"),
+            func.sum(receipts.total_amount).label("total_amount"),
+        )
+        .where(receipts.user_id == user_id, condition)
+        .group_by(receipts.vendor_key)
+        .subquery()
+    )
+    order = [vendors.c.receipts.desc(), vendors.c.vendor_key]
+    if similarity is not None:
+        order.insert(0, func.word_similarity(func.normalize_vendor(q), vendors.c.vendor_key).desc())
+    return (
+        select(
+            func.coalesce(vendor_aliases.vendor_name, vendors.c.vendor_name),
+            vendors.c.receipts,
+            vendors.c.total_amount,
+        )
+        .select_from(vendors)
+        .outerjoin(vendor_aliases, vendor_aliases.alias == vendors.c.vendor_key)
+        .order_by(*order)
+        .limit(limit)
+    )
+
+
+def format_vendor_suggestions(results) -> List[Dict]:
+    return [
+        {
+            "vendor": vendor_name,
+            "receipts": count,
+            "amount": float(total),
+        }
+        for vendor_name, count, total in results
+    ]
+
+
+get_vendor_suggestions_route = router.get(
+    "/vendors/{user_id}",
+    summary="Autocomplete vendor names from a user's receipts, with aliases grouped under one name",
+    response_model=List[Dict],
+    responses={
+        200: {"description": "Matching vendors with their receipt count and total, most used first"},
+        400: {"description": "Search term has no letters or digits"},
+        500: {"description": "READ operation error"},
+    },
+)
+
+
+async def vendor_suggestions_plan(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    match: str = Query("prefix", pattern=VENDOR_MATCHES, description="fuzzy, prefix or substring"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of vendors to return"),
+) -> ReadPlan:
+    statement = vendor_suggestions_statement(user_id, q, match, limit)
+    return ReadPlan(user_id, "vendors", statement, lambda rows: (format_vendor_suggestions(rows), None))
+
+
+VendorSuggestionsPlanDep = Annotated[ReadPlan, Depends(vendor_suggestions_plan)]
+
+
+def get_vendor_suggestions(plan: VendorSuggestionsPlanDep, session: SessionDep, request: Request):
+    return run_read(plan, session, request)
+
+
+async def get_vendor_suggestions_async(plan: VendorSuggestionsPlanDep, session: AsyncSessionDep, request: Request):
+    return await run_read_async(plan, session, request)
+
+
+get_vendor_suggestions_route(get_vendor_suggestions_async if settings.DB_ASYNC else get_vendor_suggestions)
+
+
+def monthly_stats_statement(user_id: str):
+    return (
+        select(
+            monthly_expenses.month,
+            monthly_expenses.category,
+            func.sum(monthly_expenses.total_amount).label("total_amount")
+        )
+        .where(monthly_expenses.user_id == user_id)
+        .group_by(monthly_expenses.month, monthly_expenses.category)
+        .order_by(monthly_expenses.month)
+    )
+
+
+def format_monthly_stats(results) -> List[Dict]:
+    return [
+        {
+            "month": month_name[int(month)],
+            "category": category,
+            "amount": int(total)
+        }
+        for month, category, total in results
+    ]
+
+
+get_monthly_expenses_route = router.get(
     "/getMonthlyStats/{user_id}",
     summary="Get total amount per category per month for a user",
     response_model=List[Dict],
@@ -167,33 +646,50 @@ def get_expenses(user_id: str, session: SessionDep):
         500: {"description": "READ operation error"},
     },
 )
-def get_monthly_expenses(user_id: str, session: SessionDep):
-    try:
-        results = session.exec(
-            select(
-                extract("month", receipts.receipt_date).label("month"),
-                receipts.category,
-                func.sum(receipts.total_amount).label("total_amount")
-            )
-            .where(receipts.user_id == user_id)
-            .group_by(extract("month", receipts.receipt_date), receipts.category)
-            .order_by(extract("month", receipts.receipt_date))
-        ).all()
-
-        return [
-            {
-                "month": month_name[int(month)],
-                "category": category,
-                "amount": int(total)
-            }
-            for month, category, total in results
-        ]
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"READ operation error: {e}")
-    
 
-@router.get(
+def monthly_stats_plan(user_id: str) -> ReadPlan:
+    return ReadPlan(user_id, "monthly_stats", monthly_stats_statement(user_id), lambda rows: (format_monthly_stats(rows), None))
+
+
+def get_monthly_expenses(user_id: str, session: SessionDep, request: Request):
+    return run_read(monthly_stats_plan(user_id), session, request)
+
+
+async def get_monthly_expenses_async(user_id: str, session: AsyncSessionDep, request: Request):
+    return await run_read_async(monthly_stats_plan(user_id), session, request)
+
+
+get_monthly_expenses_route(get_monthly_expenses_async if settings.DB_ASYNC else get_monthly_expenses)
+
+
+def category_stats_statement(user_id: str):
+    now = datetime.now()
+    return (
+        select(
+            monthly_expenses.category,
+            func.sum(monthly_expenses.total_amount).label("total_amount")
+        )
+        .where(
+            monthly_expenses.user_id == user_id,
+            monthly_expenses.year == now.year,
+            monthly_expenses.month == now.month
+        )
+        .group_by(monthly_expenses.category)
+    )
+
+
+def format_category_stats(results) -> List[Dict]:
+    return [
+        {
+            "category": category,
+            "amount": int(total)
+        }
+        for category, total in results
+    ]
+
+
+get_category_expenses_route = router.get(
     "/getCategoryStats/{user_id}",
     summary="Get total amount per category for the current month",
     response_model=List[Dict],
@@ -202,29 +698,18 @@ def get_monthly_expenses(user_id: str, session: SessionDep):
         500: {"description": "READ operation error"},
     },
 )
-def get_category_expenses(user_id: str, session: SessionDep):
-    try:
-        current_month = datetime.now().month
-
-        results = session.exec(
-            select(
-                receipts.category,
-                func.sum(receipts.total_amount).label("total_amount")
-            )
-            .where(
-                receipts.user_id == user_id,
-                extract("month", receipts.receipt_date) == current_month
-            )
-            .group_by(receipts.category)
-        ).all()
-
-        return [
-            {
-                "category": category,
-                "amount": int(total)
-            }
-            for category, total in results
-        ]
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"READ operation error: {e}")
+
+def category_stats_plan(user_id: str) -> ReadPlan:
+    return ReadPlan(user_id, "category_stats", category_stats_statement(user_id), lambda rows: (format_category_stats(rows), None))
+
+
+def get_category_expenses(user_id: str, session: SessionDep, request: Request):
+    return run_read(category_stats_plan(user_id), session, request)
+
+
+async def get_category_expenses_async(user_id: str, session: AsyncSessionDep, request: Request):
+    return await run_read_async(category_stats_plan(user_id), session, request)
+
+
+get_category_expenses_route(get_category_expenses_async if settings.DB_ASYNC else get_category_expenses)
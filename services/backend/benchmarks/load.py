@@ -0,0 +1,431 @@
+"""End-to-end load test of the API and the OCR worker.
+
+Seeds the database (creating the schema from deployment/tables.sql when it is missing), starts
+the API and the OCR worker with uvicorn against an in-process S3 stand-in and the stub vision
+model, and drives a weighted mix of user sessions for --duration seconds:
+
+  - login:     POST /auth/login
+  - dashboard: GET getMonthlyStats and getCategoryStats, as the dashboard polls them
+  - expenses:  GET getExpenses, the first page of 50
+  - upload:    POST uploadExpenses; the stand-in announces the object to the worker's /event
+               like a MinIO webhook, and the receipt is tracked until its row is stored
+
+Latency percentiles and throughput per endpoint, and upload-to-row latency for the OCR
+pipeline, are printed and written as JSON tagged with the git commit, so runs can be compared
+across commits. Pass --api-url and --worker-url to load an already running stack (e.g. docker
+compose with MinIO) instead. Seeded users are shared with benchmarks.login and removed with
+--cleanup. Run from services/backend against a scratch database:
+
+    python -m benchmarks.load --users 1000 --duration 60 --concurrency 16 --output load.json
+    python -m benchmarks.load --api-env DB_ASYNC=true --output load-async.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import httpx
+from PIL import Image, ImageDraw
+from sqlalchemy.engine import make_url
+from sqlmodel import text
+from app.core.config import settings
+from app.core.db import get_engine
+from benchmarks.login import seed, cleanup, EMAIL_DOMAIN, PASSWORD, CATEGORIES
+from benchmarks.s3_standin import S3StandIn
+from benchmarks.startup import free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "receipt-ocr")
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(BACKEND_DIR)), "deployment", "tables.sql")
+DEFAULT_MIX = "login=1,dashboard=6,expenses=3,upload=1"
+
+
+def init_schema(path: str) -> bool:
+    """Run tables.sql when the database has no users table yet; returns whether it ran"""
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT to_regclass('public.users')")
+        if cursor.fetchone()[0] is not None:
+            return False
+        with open(path) as f:
+            cursor.execute(f.read())
+        connection.commit()
+        return True
+    finally:
+        connection.close()
+
+
+def load_users(count: int) -> list[tuple[str, str]]:
+    """(user_id, email) of up to count seeded users, the sessions the load is spread over"""
+    with get_engine().connect() as connection:
+        rows = connection.execute(
+            text("SELECT user_id::text, email FROM users WHERE email LIKE :pattern ORDER BY random() LIMIT :count"),
+            {"pattern": f"%@{EMAIL_DOMAIN}", "count": count},
+        ).all()
+    return [tuple(row) for row in rows]
+
+
+def receipt_image() -> bytes:
+    image = Image.new("L", (600, 900), 235)
+    draw = ImageDraw.Draw(image)
+    for line in range(30):
+        draw.text((40, 40 + line * 27), f"ITEM {random.randint(100, 999)}  {random.uniform(1, 500):8.2f}", fill=20)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+class Recorder:
+    """Latency samples and status codes per endpoint, shared by the load threads"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, status):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            self.statuses[endpoint][str(status)] += 1
+
+    def timed(self, endpoint: str, send):
+        start = time.perf_counter()
+        try:
+            response = send()
+        except httpx.HTTPError as e:
+            self.record(endpoint, time.perf_counter() - start, type(e).__name__)
+            return None
+        self.record(endpoint, time.perf_counter() - start, response.status_code)
+        return response
+
+
+class OcrTracker:
+    """Polls receipts for uploaded receipt_ids and records upload-to-row latency"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.pending = {}
+        self.latencies = []
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ocr-tracker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def add(self, receipt_id: str):
+        with self.lock:
+            self.pending[receipt_id] = time.perf_counter()
+
+    def outstanding(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        query = text("SELECT receipt_id::text FROM receipts WHERE receipt_id = ANY(CAST(:ids AS uuid[]))")
+        while not self._stop.wait(self.interval):
+            with self.lock:
+                ids = list(self.pending)
+            if not ids:
+                continue
+            with get_engine().connect() as connection:
+                stored = connection.execute(query, {"ids": ids}).scalars().all()
+            now = time.perf_counter()
+            with self.lock:
+                for receipt_id in stored:
+                    uploaded_at = self.pending.pop(receipt_id, None)
+                    if uploaded_at is not None:
+                        self.latencies.append(now - uploaded_at)
+
+
+def run_session(client: httpx.Client, scenario: str, user: tuple[str, str], recorder: Recorder,
+                tracker: OcrTracker, image: bytes):
+    user_id, email = user
+    if scenario == "login":
+        recorder.timed("login", lambda: client.post("/auth/login", data={"email": email, "password": PASSWORD}))
+    elif scenario == "dashboard":
+        recorder.timed("monthly_stats", lambda: client.get(f"/receipts/getMonthlyStats/{user_id}"))
+        recorder.timed("category_stats", lambda: client.get(f"/receipts/getCategoryStats/{user_id}"))
+    elif scenario == "expenses":
+        recorder.timed("expenses", lambda: client.get(f"/receipts/getExpenses/{user_id}", params={"limit": 50}))
+    elif scenario == "upload":
+        # Trailing bytes after the JPEG end marker make every upload a distinct image for the OCR cache
+        data = image + os.urandom(16)
+        response = recorder.timed("upload", lambda: client.post(
+            "/receipts/uploadExpenses",
+            files={"file": ("receipt.jpg", data, "image/jpeg")},
+            data={"user_id": user_id, "category": random.choice(CATEGORIES)},
+        ))
+        if response is not None and response.status_code == 200:
+            tracker.add(response.json()["File"].split("_")[0])
+
+
+def run_load(api_url: str, users, mix: dict, duration: float, concurrency: int, recorder: Recorder,
+             tracker: OcrTracker) -> float:
+    scenarios, weights = zip(*mix.items())
+    image = receipt_image()
+    deadline = time.perf_counter() + duration
+
+    def worker(n: int):
+        rng = random.Random(n)
+        with httpx.Client(base_url=api_url, timeout=60) as client:
+            while time.perf_counter() < deadline:
+                run_session(client, rng.choices(scenarios, weights)[0], rng.choice(users), recorder, tracker, image)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def summarize(samples: list[float], elapsed: float) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def parse_pairs(values: list[str]) -> dict:
+    pairs = {}
+    for value in values:
+        name, _, setting = value.partition("=")
+        pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def wait_for_health(url: str, process: subprocess.Popen | None, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode}")
+    raise TimeoutError(f"{url}/health did not answer within {timeout}s")
+
+
+class LocalStack:
+    """The S3 stand-in, the OCR worker and the API, each on a free local port"""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.log_files = []
+        self.standin = None
+
+    def _log(self, name: str):
+        if not self.args.log_dir:
+            return subprocess.DEVNULL
+        os.makedirs(self.args.log_dir, exist_ok=True)
+        output = open(os.path.join(self.args.log_dir, f"{name}.log"), "w")
+        self.log_files.append(output)
+        return output
+
+    def _spawn(self, name: str, module: str, port: int, cwd: str, env: dict, extra_args: list[str] = ()) -> str:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning", *extra_args],
+            cwd=cwd, env=env, stdout=self._log(name), stderr=subprocess.STDOUT,
+        )
+        self.processes.append(process)
+        url = f"http://127.0.0.1:{port}"
+        wait_for_health(url, process)
+        return url
+
+    def __enter__(self):
+        args = self.args
+        # The stand-in needs the worker's address for its event notifications before the worker starts
+        worker_port = free_port()
+        self.standin = S3StandIn(notify_url=f"http://127.0.0.1:{worker_port}/event").start()
+        s3_env = {
+            "S3_ENDPOINT": self.standin.endpoint,
+            "S3_BUCKET": args.bucket,
+            "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID") or "standin",
+            "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY") or "standin",
+        }
+
+        database = make_url(settings.DATABASE_URI)
+        worker_env = {
+            **os.environ, **s3_env,
+            "POSTGRES_SERVER": database.query.get("host") or database.host or "localhost",
+            "POSTGRES_PORT": str(database.port or 5432),
+            "POSTGRES_DB": database.database,
+            "POSTGRES_USER": database.username or "",
+            "POSTGRES_PASSWORD": database.password or "",
+            "VISION_BACKEND": "stub",
+            "STUB_MODEL_LATENCY_MS": str(args.stub_latency_ms),
+            "OCR_RUN_MODE": "push",
+            "PYTHONPATH": WORKER_DIR,
+            **parse_pairs(args.worker_env),
+        }
+        self.worker_url = self._spawn("worker", "app:app", worker_port, WORKER_DIR, worker_env)
+
+        api_env = {**os.environ, **s3_env, **parse_pairs(args.api_env)}
+        workers = ["--workers", str(args.api_workers)] if args.api_workers > 1 else []
+        self.api_url = self._spawn("api", "app.main:app", free_port(), BACKEND_DIR, api_env, workers)
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for output in self.log_files:
+            output.close()
+        if self.standin is not None:
+            self.standin.stop()
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=BACKEND_DIR).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, cwd=BACKEND_DIR).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API and OCR worker end to end")
+    parser.add_argument("--users", type=int, default=1000, help="Seeded users")
+    parser.add_argument("--receipts-per-user", type=int, default=20)
+    parser.add_argument("--active-users", type=int, default=200, help="Seeded users the sessions are spread over")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent simulated sessions")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, from login, dashboard, expenses, upload")
+    parser.add_argument("--schema", default=SCHEMA, help="Schema to create when the database is empty")
+    parser.add_argument("--bucket", default=settings.S3_BUCKET or "images")
+    parser.add_argument("--stub-latency-ms", type=float, default=200, help="Simulated vision call time")
+    parser.add_argument("--api-workers", type=int, default=1, help="uvicorn worker processes for the API")
+    parser.add_argument("--api-env", action="append", default=[], metavar="NAME=VALUE", help="Extra API setting")
+    parser.add_argument("--worker-env", action="append", default=[], metavar="NAME=VALUE", help="Extra OCR worker setting")
+    parser.add_argument("--api-url", help="Load this running API instead of starting one")
+    parser.add_argument("--worker-url", help="OCR worker of the running stack, for its queue status")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="Seconds to wait for uploads to be stored")
+    parser.add_argument("--log-dir", help="Write the API and worker output here")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--cleanup", action="store_true", help="Delete the seeded users and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+
+    mix = {name: float(weight) for name, weight in parse_pairs(args.mix.split(",")).items()}
+    unknown = set(mix) - {"login", "dashboard", "expenses", "upload"}
+    if unknown:
+        parser.error(f"unknown scenarios in --mix: {', '.join(sorted(unknown))}")
+
+    if init_schema(args.schema):
+        print(f"Created the schema from {args.schema}")
+    seed(args.users, args.receipts_per_user)
+    users = load_users(args.active_users)
+
+    recorder = Recorder()
+    tracker = OcrTracker()
+    tracker.start()
+    stack = None
+    try:
+        if args.api_url:
+            api_url, worker_url = args.api_url, args.worker_url
+        else:
+            stack = LocalStack(args).__enter__()
+            api_url, worker_url = stack.api_url, stack.worker_url
+
+        elapsed = run_load(api_url, users, mix, args.duration, args.concurrency, recorder, tracker)
+        uploads = recorder.statuses["upload"]["200"]
+        drain_start = time.perf_counter()
+        while tracker.outstanding() and time.perf_counter() - drain_start < args.drain_timeout:
+            time.sleep(0.1)
+        pipeline_elapsed = elapsed + time.perf_counter() - drain_start
+
+        worker_queue = None
+        if worker_url:
+            try:
+                worker_queue = httpx.get(f"{worker_url}/queue", timeout=5).json()
+            except httpx.HTTPError:
+                pass
+        s3 = stack.standin.stats() if stack else None
+    finally:
+        tracker.stop()
+        if stack is not None:
+            stack.__exit__(None, None, None)
+
+    endpoints = {}
+    for endpoint in sorted(recorder.samples):
+        statuses = recorder.statuses[endpoint]
+        endpoints[endpoint] = {
+            **summarize(recorder.samples[endpoint], elapsed),
+            "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+            "statuses": dict(statuses),
+        }
+    results = {
+        **git_revision(),
+        "config": {
+            "users": args.users,
+            "receipts_per_user": args.receipts_per_user,
+            "active_users": len(users),
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": mix,
+            "stub_latency_ms": None if args.api_url else args.stub_latency_ms,
+            "api_workers": None if args.api_url else args.api_workers,
+            "api_env": parse_pairs(args.api_env),
+            "worker_env": parse_pairs(args.worker_env),
+            "api_url": args.api_url,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "total": {
+            "requests": sum(len(samples) for samples in recorder.samples.values()),
+            "throughput_rps": round(sum(len(samples) for samples in recorder.samples.values()) / elapsed, 2),
+        },
+        "endpoints": endpoints,
+        "ocr_pipeline": {
+            "uploads": uploads,
+            "stored": len(tracker.latencies),
+            "not_stored": tracker.outstanding(),
+            **{name: value for name, value in summarize(tracker.latencies, pipeline_elapsed).items() if name != "count"},
+        },
+        "worker_queue": worker_queue,
+        "s3": s3,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Login micro-benchmark against a seeded dataset.
+
+Seeds --users users (100k by default) with a few receipts each, then reports p50/p99 for
+  - the login queries on their own, before and after the fast path
+  - the whole POST /auth/login request, including bcrypt
+
+Seeded rows use the @bench.expensa.local email domain and are removed with --cleanup.
+Run from services/backend against a scratch database:
+
+    python -m benchmarks.login --users 100000 --requests 500
+"""
+import argparse
+import io
+import json
+import random
+import statistics
+import time
+from datetime import date
+from uuid import uuid4
+
+import bcrypt
+from sqlmodel import Session, select, func, text, extract
+from app.core.config import settings
+from app.core.db import get_engine
+from app.db.models import users, receipts
+from app.routers.auth import credentials_query, profile_query, profile_params
+
+EMAIL_DOMAIN = "bench.expensa.local"
+PASSWORD = "benchmark-password"
+CATEGORIES = ["food", "entertainment", "work"]
+
+
+def bench_email(n: int) -> str:
+    return f"user{n}@{EMAIL_DOMAIN}"
+
+
+def seed(user_count: int, receipts_per_user: int):
+    """COPY users and receipts in; every user shares one precomputed hash so seeding does not pay for bcrypt"""
+    with Session(get_engine()) as session:
+        existing = session.exec(
+            select(func.count()).select_from(users).where(users.email.like(f"%@{EMAIL_DOMAIN}"))
+        ).one()
+    if existing >= user_count:
+        print(f"Using {existing} existing benchmark users")
+        return
+
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode("utf-8")
+    today = date.today()
+    user_rows = io.StringIO()
+    receipt_rows = io.StringIO()
+    for n in range(existing, user_count):
+        user_id = str(uuid4())
+        user_rows.write(f"{user_id}\t{bench_email(n)}\tuser{n}\t{hashed}\t{random.randint(0, 5000)}\n")
+        for _ in range(receipts_per_user):
+            # Spread over the last three years so a month-only filter would pick up old receipts
+            receipt_date = date(today.year - random.randint(0, 2), random.randint(1, 12), random.randint(1, 28))
+            receipt_rows.write(
+                f"{uuid4()}\t{user_id}\t{random.choice(CATEGORIES)}\t{receipt_date.isoformat()}"
+                f"\tVendor {random.randint(1, 500)}\t{random.uniform(1, 200):.2f}\n"
+            )
+
+    start = time.perf_counter()
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        user_rows.seek(0)
+        cursor.copy_expert("COPY users (user_id, email, username, password, budget) FROM STDIN", user_rows)
+        receipt_rows.seek(0)
+        cursor.copy_expert(
+            "COPY receipts (receipt_id, user_id, category, receipt_date, vendor_name, total_amount) FROM STDIN",
+            receipt_rows,
+        )
+        cursor.execute("ANALYZE users")
+        cursor.execute("ANALYZE receipts")
+        connection.commit()
+    finally:
+        connection.close()
+    print(f"Seeded {user_count - existing} users in {time.perf_counter() - start:.1f}s")
+
+
+def cleanup():
+    with Session(get_engine()) as session:
+        session.execute(text("DELETE FROM users WHERE email LIKE :pattern").bindparams(pattern=f"%@{EMAIL_DOMAIN}"))
+        session.commit()
+
+
+def legacy_queries(session: Session, email: str):
+    # What login ran before: the whole user row, then a month-only SUM over receipts
+    user = session.exec(select(users).where(users.email == email)).first()
+    session.exec(
+        select(func.sum(receipts.total_amount)).where(
+            receipts.user_id == user.user_id,
+            extract("month", receipts.receipt_date) == date.today().month,
+        )
+    ).one()
+
+
+def fast_path_queries(session: Session, email: str):
+    credentials = session.exec(credentials_query, params={"email": email}).first()
+    session.exec(profile_query, params=profile_params(credentials.user_id)).one()
+
+
+def percentiles(samples: list[float]) -> dict:
+    cuts = statistics.quantiles(samples, n=100)
+    return {
+        "count": len(samples),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def time_queries(fn, emails: list[str]) -> dict:
+    samples = []
+    with Session(get_engine()) as session:
+        for email in emails:
+            start = time.perf_counter()
+            fn(session, email)
+            samples.append(time.perf_counter() - start)
+            session.rollback()
+    return percentiles(samples)
+
+
+def time_logins(emails: list[str]) -> dict:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    samples = []
+    with TestClient(app) as client:
+        for email in emails:
+            start = time.perf_counter()
+            response = client.post("/auth/login", data={"email": email, "password": PASSWORD})
+            samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login latency against a seeded dataset")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--receipts-per-user", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--cleanup", action="store_true", help="Delete the seeded users and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+
+    seed(args.users, args.receipts_per_user)
+    emails = [bench_email(random.randrange(args.users)) for _ in range(args.requests)]
+
+    results = {
+        "users": args.users,
+        "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        "db_async": settings.DB_ASYNC,
+        "queries_legacy": time_queries(legacy_queries, emails),
+        "queries_fast_path": time_queries(fast_path_queries, emails),
+        "login": time_logins(emails),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
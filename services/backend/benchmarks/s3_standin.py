@@ -0,0 +1,216 @@
+"""In-process stand-in for S3/MinIO, for local load tests without object storage.
+
+Serves the subset of the S3 REST API the API and the OCR worker use (PutObject, GetObject,
+HeadObject, DeleteObject and multipart uploads) from memory, with path-style addressing and
+no signature checks. Like a MinIO webhook, every created object can be announced to the OCR
+worker's /event endpoint as an s3:ObjectCreated event.
+"""
+import hashlib
+import http.client
+import json
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.sax.saxutils import escape
+
+# Request headers kept with an object and returned by GET and HEAD
+STORED_HEADERS = ("content-type", "cache-control")
+
+
+def read_aws_chunked(rfile):
+    """Decode an aws-chunked body: "<hex size>[;chunk-signature=...]\\r\\n<data>\\r\\n" until a 0-size chunk"""
+    body = bytearray()
+    while True:
+        size = int(rfile.readline().split(b";")[0].strip(), 16)
+        if size == 0:
+            # Trailing checksum headers end with an empty line
+            while rfile.readline().strip():
+                pass
+            return bytes(body)
+        body += rfile.read(size)
+        rfile.readline()
+
+
+class S3StandIn:
+    """Run with start(); endpoint is the URL to use as S3_ENDPOINT / endpoint_url"""
+
+    def __init__(self, host="127.0.0.1", port=0, notify_url=None, notify_workers=4):
+        self.objects = {}
+        self.uploads = {}
+        self.requests = defaultdict(int)
+        self.notify_url = notify_url
+        self.notify_errors = 0
+        self.lock = threading.Lock()
+        self._notifier = ThreadPoolExecutor(max_workers=notify_workers, thread_name_prefix="s3-notify")
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="s3-standin", daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._notifier.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "objects": len(self.objects),
+                "bytes": sum(len(body) for body, _ in self.objects.values()),
+                "requests": dict(self.requests),
+                "notify_errors": self.notify_errors,
+            }
+
+    def put(self, bucket: str, key: str, body: bytes, headers: dict):
+        with self.lock:
+            self.objects[(bucket, key)] = (body, headers)
+        if self.notify_url:
+            self._notifier.submit(self._notify, bucket, key, len(body), headers.get("etag", ""))
+
+    def _notify(self, bucket: str, key: str, size: int, etag: str):
+        event = {
+            "EventName": "s3:ObjectCreated:Put",
+            "Key": f"{bucket}/{key}",
+            "Records": [{
+                "eventVersion": "2.0",
+                "eventSource": "minio:s3",
+                "eventName": "s3:ObjectCreated:Put",
+                "s3": {
+                    "bucket": {"name": bucket},
+                    "object": {"key": key, "size": size, "eTag": etag.strip('"')},
+                },
+            }],
+        }
+        url = urlsplit(self.notify_url)
+        try:
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+            connection.request("POST", url.path or "/", json.dumps(event), {"Content-Type": "application/json"})
+            if connection.getresponse().status >= 300:
+                raise RuntimeError("event rejected")
+        except Exception:
+            with self.lock:
+                self.notify_errors += 1
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _target(self):
+                url = urlsplit(self.path)
+                bucket, _, key = url.path.lstrip("/").partition("/")
+                return bucket, unquote(key), parse_qs(url.query, keep_blank_values=True)
+
+            def _body(self) -> bytes:
+                if "aws-chunked" in self.headers.get("Content-Encoding", "") or \
+                        self.headers.get("x-amz-content-sha256", "").startswith("STREAMING-"):
+                    return read_aws_chunked(self.rfile)
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _send(self, status: int, body: bytes = b"", headers: dict | None = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _xml(self, status: int, root: str, fields: dict):
+                inner = "".join(f"<{name}>{escape(str(value))}</{name}>" for name, value in fields.items())
+                body = f'<?xml version="1.0" encoding="UTF-8"?><{root}>{inner}</{root}>'.encode()
+                self._send(status, body, {"Content-Type": "application/xml"})
+
+            def _not_found(self, bucket: str, key: str):
+                self._xml(404, "Error", {"Code": "NoSuchKey", "Message": "The specified key does not exist.",
+                                         "Key": key, "BucketName": bucket})
+
+            def _count(self, operation: str):
+                with standin.lock:
+                    standin.requests[operation] += 1
+
+            def do_PUT(self):
+                bucket, key, query = self._target()
+                body = self._body()
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if "uploadId" in query:
+                    self._count("UploadPart")
+                    with standin.lock:
+                        standin.uploads[query["uploadId"][0]]["parts"][int(query["partNumber"][0])] = body
+                    return self._send(200, headers={"ETag": etag})
+
+                self._count("PutObject")
+                headers = {name: self.headers[name] for name in STORED_HEADERS if self.headers.get(name)}
+                headers.update({name.lower(): value for name, value in self.headers.items()
+                                if name.lower().startswith("x-amz-meta-")})
+                headers["etag"] = etag
+                standin.put(bucket, key, body, headers)
+                self._send(200, headers={"ETag": etag})
+
+            def do_POST(self):
+                bucket, key, query = self._target()
+                self._body()
+                if "uploads" in query:
+                    self._count("CreateMultipartUpload")
+                    upload_id = uuid.uuid4().hex
+                    headers = {name: self.headers[name] for name in STORED_HEADERS if self.headers.get(name)}
+                    headers.update({name.lower(): value for name, value in self.headers.items()
+                                    if name.lower().startswith("x-amz-meta-")})
+                    with standin.lock:
+                        standin.uploads[upload_id] = {"headers": headers, "parts": {}}
+                    return self._xml(200, "InitiateMultipartUploadResult",
+                                     {"Bucket": bucket, "Key": key, "UploadId": upload_id})
+                if "uploadId" in query:
+                    self._count("CompleteMultipartUpload")
+                    with standin.lock:
+                        upload = standin.uploads.pop(query["uploadId"][0])
+                    body = b"".join(part for _, part in sorted(upload["parts"].items()))
+                    etag = f'"{hashlib.md5(body).hexdigest()}-{len(upload["parts"])}"'
+                    standin.put(bucket, key, body, {**upload["headers"], "etag": etag})
+                    return self._xml(200, "CompleteMultipartUploadResult",
+                                     {"Bucket": bucket, "Key": key, "ETag": etag})
+                self._send(400)
+
+            def do_GET(self):
+                bucket, key, _ = self._target()
+                self._count("GetObject" if self.command == "GET" else "HeadObject")
+                with standin.lock:
+                    stored = standin.objects.get((bucket, key))
+                if stored is None:
+                    return self._not_found(bucket, key)
+                body, headers = stored
+                response_headers = {name: value for name, value in headers.items() if name != "etag"}
+                response_headers.setdefault("content-type", "binary/octet-stream")
+                response_headers["ETag"] = headers["etag"]
+                response_headers["Last-Modified"] = formatdate(usegmt=True)
+                self._send(200, body, response_headers)
+
+            do_HEAD = do_GET
+
+            def do_DELETE(self):
+                bucket, key, query = self._target()
+                with standin.lock:
+                    if "uploadId" in query:
+                        standin.uploads.pop(query["uploadId"][0], None)
+                    else:
+                        standin.objects.pop((bucket, key), None)
+                self._count("DeleteObject")
+                self._send(204)
+
+        return Handler
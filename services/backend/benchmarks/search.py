@@ -0,0 +1,171 @@
+"""Vendor search benchmark against one user with a large history.
+
+Seeds a user with --receipts receipts (100k by default) spread over a few hundred merchants, each
+written several ways the way OCR reads them, then reports p50/p95 of the /receipts/search and
+/receipts/vendors queries for each match mode. The goal is a p95 under 20 ms; --explain prints the
+plan of one search so the use of idx_receipts_vendor_trgm can be checked.
+
+The seeded user is bench-search@bench.expensa.local and is removed with --cleanup.
+Run from services/backend against a scratch database:
+
+    python -m benchmarks.search --receipts 100000 --requests 200
+"""
+import argparse
+import io
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from uuid import uuid4
+
+from sqlmodel import Session, select, text
+from app.core.config import settings
+from app.core.db import get_engine
+from app.db.models import users
+from app.routers.receipts import search_statement, vendor_suggestions_statement
+
+EMAIL = "bench-search@bench.expensa.local"
+CATEGORIES = ["food", "entertainment", "work"]
+MERCHANTS = [
+    f"{first} {second}"
+    for first in ["Star", "Green", "City", "Royal", "Fresh", "Blue", "Golden", "Urban", "Happy", "Metro",
+                  "Silver", "Sunny", "Prime", "Corner", "Grand", "Lucky", "Spice", "Daily"]
+    for second in ["Bucks", "Mart", "Bazaar", "Cafe", "Kitchen", "Pharmacy", "Fuel", "Books", "Bakery",
+                   "Cinema", "Diner", "Market", "Travels", "Electronics", "Grocers", "Tailors", "Foods"]
+]
+
+
+def spellings(merchant: str) -> list[str]:
+    """Forms OCR produces for the same shop"""
+    branch = random.randint(100, 999)
+    return [merchant, merchant.upper(), f"{merchant.upper()} #{branch}", f"{merchant} Pvt. Ltd.", merchant.replace(" ", "")]
+
+
+def seed(receipt_count: int) -> str:
+    with Session(get_engine()) as session:
+        user_id = session.exec(select(users.user_id).where(users.email == EMAIL)).first()
+    if user_id:
+        print(f"Using existing benchmark user {user_id}")
+        return user_id
+
+    user_id = str(uuid4())
+    names = {merchant: spellings(merchant) for merchant in MERCHANTS}
+    # A few merchants account for most receipts, like a real history
+    weights = [1 / (rank + 1) for rank in range(len(MERCHANTS))]
+    today = date.today()
+    oldest = today - timedelta(days=5 * 365)
+    rows = io.StringIO()
+    for merchant in random.choices(MERCHANTS, weights=weights, k=receipt_count):
+        receipt_date = oldest + timedelta(days=random.randint(0, 5 * 365))
+        rows.write(
+            f"{uuid4()}\t{user_id}\t{random.choice(CATEGORIES)}\t{receipt_date.isoformat()}"
+            f"\t{random.choice(names[merchant])}\t{random.uniform(1, 200):.2f}\n"
+        )
+
+    start = time.perf_counter()
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO users (user_id, email, username, password, budget) VALUES (%s, %s, 'bench', '-', 0)",
+            (user_id, EMAIL),
+        )
+        # Partitions for the whole history up front, so nothing lands in receipts_default
+        cursor.execute(
+            "SELECT create_receipts_partition(period::date, %s) FROM generate_series(%s::date, %s::date, %s) period",
+            (settings.RECEIPTS_PARTITION_INTERVAL, oldest, today, f"1 {settings.RECEIPTS_PARTITION_INTERVAL}"),
+        )
+        rows.seek(0)
+        cursor.copy_expert(
+            "COPY receipts (receipt_id, user_id, category, receipt_date, vendor_name, total_amount) FROM STDIN", rows
+        )
+        cursor.execute("ANALYZE receipts")
+        connection.commit()
+    finally:
+        connection.close()
+    print(f"Seeded {receipt_count} receipts in {time.perf_counter() - start:.1f}s")
+    return user_id
+
+
+def cleanup():
+    with Session(get_engine()) as session:
+        session.execute(text("DELETE FROM users WHERE email = :email").bindparams(email=EMAIL))
+        session.commit()
+
+
+def search_terms(count: int) -> list[str]:
+    """Prefixes and fragments of merchant names, as typed into a search box"""
+    terms = []
+    for _ in range(count):
+        merchant = random.choice(MERCHANTS).lower()
+        start = random.randint(0, 3)
+        terms.append(merchant[start:start + random.randint(3, 8)].strip() or merchant[:3])
+    return terms
+
+
+def percentiles(samples: list[float]) -> dict:
+    cuts = statistics.quantiles(samples, n=100)
+    return {
+        "count": len(samples),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def time_statements(build, terms: list[str]) -> dict:
+    samples = []
+    with Session(get_engine()) as session:
+        for term in terms:
+            statement = build(term)
+            start = time.perf_counter()
+            session.exec(statement).all()
+            samples.append(time.perf_counter() - start)
+            session.rollback()
+    return percentiles(samples)
+
+
+def explain(statement) -> str:
+    with Session(get_engine()) as session:
+        compiled = statement.compile(get_engine(), compile_kwargs={"literal_binds": True})
+        # Sent as driver SQL so the %% escapes in the compiled LIKE patterns are undone
+        plan = session.connection().exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}").all()
+        return "\n".join(line for line, in plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vendor search latency for a user with a large history")
+    parser.add_argument("--receipts", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--match", nargs="+", choices=["fuzzy", "prefix", "substring"],
+                        default=["fuzzy", "prefix", "substring"])
+    parser.add_argument("--explain", action="store_true", help="Print the plan of one substring search")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--cleanup", action="store_true", help="Delete the seeded user and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+
+    user_id = seed(args.receipts)
+    terms = search_terms(args.requests)
+    results = {"receipts": args.receipts, "search": {}, "vendors": {}}
+    for match in args.match:
+        results["search"][match] = time_statements(
+            lambda term: search_statement(user_id, term, match, None, None, None, 50), terms
+        )
+        results["vendors"][match] = time_statements(
+            lambda term: vendor_suggestions_statement(user_id, term, match, 10), terms
+        )
+    print(json.dumps(results, indent=2))
+    if args.explain:
+        print(explain(search_statement(user_id, terms[0], "substring", None, None, None, 50)))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Per-row CPU cost of rendering getExpenses responses, before and after the lean path.
+
+Builds --rows result tuples shaped like expenses_statement rows and times
+  - legacy: strftime + Expenses model per row, rendered by JSONResponse (stdlib json)
+  - current: page_expenses dicts rendered with orjson, as ResponseCache.store does
+checking first that both produce identical bytes. No database is needed:
+
+    python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import date, timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+import orjson
+from fastapi.responses import JSONResponse
+from app.core.models import Expenses, CATEGORIES
+from app.routers.receipts import page_expenses
+
+
+def make_rows(count: int) -> list[tuple]:
+    rng = random.Random(0)
+    start = date(2020, 1, 1)
+    return [
+        (
+            start + timedelta(days=rng.randrange(2000)),
+            rng.choice(CATEGORIES),
+            rng.choice(["Café Coffee Day", "Big Bazaar", "Amazon", "Uber", 'Joe\'s "Diner"']),
+            Decimal(rng.randrange(100, 10_000_000)) / 100,
+            rng.choice([None, f"http://localhost:9000/thumbnails/{uuid4()}_receipt.webp"]),
+            str(uuid4()),
+        )
+        for _ in range(count)
+    ]
+
+
+def legacy_render(rows) -> bytes:
+    content = [
+        Expenses(**{
+            "date": receipt_date.strftime("%b %d, %Y"),
+            "category": category,
+            "vendor": vendor_name,
+            "amount": float(total_amount),
+            "thumbnail": thumbnail_url,
+        }).model_dump()
+        for receipt_date, category, vendor_name, total_amount, thumbnail_url, _ in rows
+    ]
+    return JSONResponse(content).body
+
+
+def current_render(rows) -> bytes:
+    content, _ = page_expenses(rows, None)
+    return orjson.dumps(content)
+
+
+def per_row_us(fn, rows, repeat: int) -> float:
+    best = min(timeit.repeat(lambda: fn(rows), number=1, repeat=repeat))
+    return best / len(rows) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark getExpenses response rendering")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    if legacy_render(rows) != current_render(rows):
+        raise SystemExit("Rendered bodies differ between the legacy and current paths")
+
+    legacy = per_row_us(legacy_render, rows, args.repeat)
+    current = per_row_us(current_render, rows, args.repeat)
+    results = {
+        "rows": args.rows,
+        "byte_identical": True,
+        "legacy_us_per_row": round(legacy, 3),
+        "current_us_per_row": round(current, 3),
+        "speedup": round(legacy / current, 2),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Startup budget check for the API.
+
+Measures, in fresh interpreters,
+  - the cumulative import time of app.main from `python -X importtime`
+  - cold start: time from spawning uvicorn to the first 200 from /health
+and exits non-zero when either median is over its budget, or when a module that should only
+load on first use (boto3, the DB drivers) is imported at startup. Suitable as a CI step:
+
+    python -m benchmarks.startup --import-budget-ms 1000 --cold-start-budget-ms 2500
+"""
+import argparse
+import http.client
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+# Loaded lazily by app.core.storage and app.core.db; importing any of them at startup is a regression
+LAZY_MODULES = ["boto3", "botocore.session", "psycopg2", "asyncpg"]
+
+
+def import_profile(module: str) -> tuple[float, dict]:
+    """Run `python -X importtime -c "import <module>"` and return (total ms, {module: cumulative ms})"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules[module], modules
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cold_start(timeout: float = 30) -> float:
+    """Milliseconds from spawning uvicorn until /health answers 200"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                connection.request("GET", "/health")
+                if connection.getresponse().status == 200:
+                    return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check API import time and cold start against a budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1000)
+    parser.add_argument("--cold-start-budget-ms", type=float, default=2500)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to report")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    import_times = []
+    modules = {}
+    for _ in range(args.runs):
+        total, modules = import_profile("app.main")
+        import_times.append(total)
+    cold_starts = [cold_start() for _ in range(args.runs)]
+
+    loaded_eagerly = [name for name in LAZY_MODULES if name in modules]
+    slowest = sorted(
+        ((name, ms) for name, ms in modules.items() if name.startswith("app.") or "." not in name),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+    results = {
+        "import_ms": {"median": round(statistics.median(import_times), 1), "min": round(min(import_times), 1)},
+        "cold_start_ms": {"median": round(statistics.median(cold_starts), 1), "min": round(min(cold_starts), 1)},
+        "budgets_ms": {"import": args.import_budget_ms, "cold_start": args.cold_start_budget_ms},
+        "loaded_eagerly": loaded_eagerly,
+        "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest},
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if results["import_ms"]["median"] > args.import_budget_ms:
+        failures.append(f"import app.main took {results['import_ms']['median']} ms (budget {args.import_budget_ms} ms)")
+    if results["cold_start_ms"]["median"] > args.cold_start_budget_ms:
+        failures.append(f"cold start took {results['cold_start_ms']['median']} ms (budget {args.cold_start_budget_ms} ms)")
+    if loaded_eagerly:
+        failures.append(f"imported at startup instead of on first use: {', '.join(loaded_eagerly)}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
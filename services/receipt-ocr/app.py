@@ -1,21 +1,58 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import json
-from handler import lambda_handler
+from handler import service_stats
+import metrics
+from work_queue import WorkQueue, QueueFull
+from job_queue import JobPoller, RUN_MODE
 
-app = FastAPI()
 
-@app.post("/event")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In poll mode events are persisted to ocr_jobs and processed at the pollers' own pace
+    app.state.work_queue = JobPoller() if RUN_MODE == 'poll' else WorkQueue()
+    app.state.work_queue.start()
+    yield
+    await app.state.work_queue.drain()
+
+
+app = FastAPI(lifespan=lifespan)
+
+@app.post("/event", status_code=202)
 async def handle_event(request: Request):
     try:
         event = await request.json()
         print("Received event:", json.dumps(event, indent=2))
-        result = lambda_handler(event)
-        return JSONResponse(content=json.loads(result["body"]), status_code=result["statusCode"])
+        records = event.get("Records", [])
+        work_queue = request.app.state.work_queue
+        if isinstance(work_queue, JobPoller):
+            await work_queue.submit(records)
+        else:
+            work_queue.submit(records)
+        return JSONResponse(content={"message": "Accepted", "queued": len(records)}, status_code=202)
+    except QueueFull as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.get("/queue")
+def queue_status(request: Request):
+    return request.app.state.work_queue.status()
+
+
+@app.get("/stats")
+def stats():
+    return service_stats()
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+
 @app.get("/health")
 def health_check():
     try:
@@ -0,0 +1,118 @@
+"""Throughput and token cost of batched vision calls.
+
+Sends --count generated receipt images through handler.recognize_receipts once per batch size
+in --batch-sizes, on the stub model with a simulated per-call and per-image latency, and reports
+receipts per second, vision calls and tokens per receipt. Every batch size must return the same
+receipts as single-image calls. --drop-rate makes the stub leave receipts out of batched
+responses, exercising the single-image fallback. Run from services/receipt-ocr:
+
+    python -m benchmarks.batching --count 64 --batch-sizes 1,4,8,16 --output batching.json
+"""
+import argparse
+import io
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+import handler
+from image_prep import preprocess_image
+from stub_model import StubVisionModel, StubResponse
+
+
+class CountingModel:
+    """Wraps the stub to count calls and tokens, optionally dropping entries from batched responses"""
+
+    def __init__(self, model, drop_rate, seed=0):
+        self.model = model
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def generate_content(self, contents):
+        response = self.model.generate_content(contents)
+        self.calls += 1
+        self.prompt_tokens += response.usage_metadata.prompt_token_count
+        self.output_tokens += response.usage_metadata.candidates_token_count
+        if self.drop_rate and response.text.startswith("```json\n["):
+            entries = json.loads(response.text.removeprefix("```json\n").removesuffix("\n```"))
+            kept = [entry for entry in entries if self.rng.random() >= self.drop_rate]
+            return StubResponse(f"```json\n{json.dumps(kept)}\n```", response.usage_metadata)
+        return response
+
+
+def generate_images(count):
+    """Small distinct receipt-like JPEGs, preprocessed the way the worker sends them"""
+    rng = random.Random(0)
+    images = []
+    for n in range(count):
+        image = Image.new('L', (600, 900), 235)
+        draw = ImageDraw.Draw(image)
+        for line in range(30):
+            draw.text((40, 40 + line * 27), f"ITEM {rng.randint(100, 999)}  {rng.uniform(1, 500):8.2f}", fill=20)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=85)
+        data, mime_type, _ = preprocess_image(output.getvalue())
+        images.append((f"{n:05d}_receipt.jpg", data, mime_type))
+    return images
+
+
+def run(images, batch_size, workers, latency_ms, image_latency_ms, drop_rate):
+    model = CountingModel(StubVisionModel(latency_ms, image_latency_ms), drop_rate)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = handler.recognize_receipts(model, images, executor, batch_size)
+    elapsed = time.perf_counter() - start
+    return results, {
+        "batch_size": batch_size,
+        "elapsed_s": round(elapsed, 3),
+        "receipts_per_second": round(len(images) / elapsed, 2),
+        "vision_calls": model.calls,
+        "prompt_tokens_per_receipt": round(model.prompt_tokens / len(images), 1),
+        "output_tokens_per_receipt": round(model.output_tokens / len(images), 1),
+        "tokens_per_receipt": round((model.prompt_tokens + model.output_tokens) / len(images), 1),
+        "failed": sum(1 for data in results.values() if isinstance(data, Exception)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched vision calls against the stub model")
+    parser.add_argument("--count", type=int, default=64, help="Receipt images to recognize per run")
+    parser.add_argument("--batch-sizes", default="1,4,8,16", help="Comma-separated OCR_VISION_BATCH_SIZE values")
+    parser.add_argument("--workers", type=int, default=handler.MAX_WORKERS, help="Concurrent vision calls")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Simulated round-trip time per call")
+    parser.add_argument("--image-latency-ms", type=float, default=50, help="Simulated time per image in a call")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of batched entries the stub leaves out")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    images = generate_images(args.count)
+    runs = []
+    baseline = None
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        results, stats = run(images, batch_size, args.workers, args.latency_ms, args.image_latency_ms, args.drop_rate)
+        if baseline is None:
+            baseline = results
+        stats["matches_first_run"] = results == baseline
+        runs.append(stats)
+
+    output = {
+        "images": args.count,
+        "workers": args.workers,
+        "latency_ms": args.latency_ms,
+        "image_latency_ms": args.image_latency_ms,
+        "drop_rate": args.drop_rate,
+        "runs": runs,
+    }
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
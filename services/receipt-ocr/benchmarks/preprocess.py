@@ -0,0 +1,134 @@
+"""Payload and latency benchmark for image_prep.preprocess_image.
+
+Runs every image in --corpus (or a generated set of phone-sized receipt photos) through the
+vision call twice, once with the original bytes and once preprocessed, and reports payload
+sizes and timings. The stub model is used unless --backend gemini is given with API_KEY set;
+only the gemini backend measures real model latency.
+
+Run from services/receipt-ocr:
+
+    python -m benchmarks.preprocess --output preprocess.json
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+import handler
+from image_prep import detect_mime_type, preprocess_image, MAX_DIMENSION, JPEG_QUALITY, GRAYSCALE
+
+
+def generate_corpus(directory, count):
+    """Write synthetic receipt photos: noisy paper with lines of text, at common phone resolutions"""
+    sizes = [(4032, 3024), (3024, 4032), (4000, 3000), (2268, 4032), (1080, 2400)]
+    rng = random.Random(0)
+    paths = []
+    for n in range(count):
+        width, height = sizes[n % len(sizes)]
+        noise = Image.effect_noise((width, height), 24).convert('RGB')
+        image = Image.blend(Image.new('RGB', (width, height), (236, 230, 218)), noise, 0.25)
+        draw = ImageDraw.Draw(image)
+        for line in range(40):
+            y = height // 10 + line * (height // 55)
+            text = f"ITEM {rng.randint(100, 999)}  x{rng.randint(1, 5)}  {rng.uniform(1, 500):8.2f}"
+            draw.text((width // 6, y), text, fill=(30, 30, 30), font_size=max(height // 70, 10))
+
+        exif = Image.Exif()
+        exif[0x0112] = 6 if width > height else 1  # Orientation
+        exif[0x010F] = "Benchmark Phone"  # Make
+        if n % 4 == 3:
+            path = os.path.join(directory, f"receipt_{n}.png")
+            image.save(path, format='PNG')
+        else:
+            path = os.path.join(directory, f"receipt_{n}.jpg")
+            image.save(path, format='JPEG', quality=92, exif=exif.tobytes())
+        paths.append(path)
+    return paths
+
+
+def time_vision_call(model, data, mime_type):
+    start = time.perf_counter()
+    response = handler.process_image(model, data, mime_type)
+    handler.extract_receipt_data(response.text)
+    return (time.perf_counter() - start) * 1000
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "mean": round(statistics.fmean(values), 2),
+        "p50": round(values[len(values) // 2], 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark receipt image preprocessing")
+    parser.add_argument("--corpus", help="Directory of receipt images; a synthetic corpus is generated when omitted")
+    parser.add_argument("--count", type=int, default=10, help="Images to generate for the synthetic corpus")
+    parser.add_argument("--backend", choices=["stub", "gemini"], default="stub")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    handler.VISION_BACKEND = args.backend
+    model = handler.init_vision_model()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.corpus:
+            paths = sorted(
+                os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                if not name.startswith('.')
+            )
+        else:
+            paths = generate_corpus(scratch, args.count)
+
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                original = f.read()
+            mime_type = detect_mime_type(original)
+            prepared, prepared_type, stats = preprocess_image(original)
+            images.append({
+                "file": os.path.basename(path),
+                "mime_type": mime_type,
+                "bytes_before": len(original),
+                "bytes_after": len(prepared),
+                "base64_before": len(base64.b64encode(original)),
+                "base64_after": len(base64.b64encode(prepared)),
+                "exif_removed": bool(Image.open(io.BytesIO(original)).getexif()) and not Image.open(io.BytesIO(prepared)).getexif(),
+                "preprocess_ms": round(stats["timings_ms"].get("total_ms", 0), 2),
+                "vision_ms_before": round(time_vision_call(model, original, mime_type), 2),
+                "vision_ms_after": round(time_vision_call(model, prepared, prepared_type), 2),
+            })
+
+    total_before = sum(image["bytes_before"] for image in images)
+    total_after = sum(image["bytes_after"] for image in images)
+    results = {
+        "backend": args.backend,
+        "max_dimension": MAX_DIMENSION,
+        "jpeg_quality": JPEG_QUALITY,
+        "grayscale": GRAYSCALE,
+        "images": len(images),
+        "bytes_before": total_before,
+        "bytes_after": total_after,
+        "payload_reduction": round(1 - total_after / total_before, 4) if total_before else 0.0,
+        "preprocess_ms": summarize([image["preprocess_ms"] for image in images]),
+        "vision_ms_before": summarize([image["vision_ms_before"] for image in images]),
+        "vision_ms_after": summarize([image["vision_ms_after"] for image in images]),
+        "per_image": images,
+    }
+    print(json.dumps({key: value for key, value in results.items() if key != "per_image"}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Bytes transferred by a receipt list view, loading originals versus thumbnails.
+
+Thumbnails every image in --corpus (or a generated set of phone-sized receipt photos) in each
+thumbnail format and reports what a list page of --page-size receipts downloads with the
+s3_url originals and with thumbnail_url. A repeat visit downloads neither, as both are served
+with an immutable Cache-Control. Run from services/receipt-ocr:
+
+    python -m benchmarks.thumbnails --page-size 50 --output thumbnails.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.preprocess import generate_corpus, summarize
+from image_prep import make_thumbnail, THUMBNAIL_TYPES, THUMBNAIL_MAX_DIMENSION, THUMBNAIL_QUALITY, IMMUTABLE_CACHE_CONTROL
+
+
+def page_bytes(sizes, page_size):
+    """Bytes for a page of page_size receipts cycling through the corpus"""
+    return sum(sizes[n % len(sizes)] for n in range(page_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list view bytes for original images and thumbnails")
+    parser.add_argument("--corpus", help="Directory of receipt images; a synthetic corpus is generated when omitted")
+    parser.add_argument("--count", type=int, default=10, help="Images to generate for the synthetic corpus")
+    parser.add_argument("--page-size", type=int, default=50, help="Receipts shown on one list page")
+    parser.add_argument("--max-dimension", type=int, default=THUMBNAIL_MAX_DIMENSION)
+    parser.add_argument("--quality", type=int, default=THUMBNAIL_QUALITY)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.corpus:
+            paths = sorted(
+                os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                if not name.startswith('.')
+            )
+        else:
+            paths = generate_corpus(scratch, args.count)
+        originals = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                originals.append(f.read())
+
+    original_sizes = [len(data) for data in originals]
+    original_page = page_bytes(original_sizes, args.page_size)
+    formats = {}
+    for fmt in THUMBNAIL_TYPES:
+        sizes, timings = [], []
+        for data in originals:
+            start = time.perf_counter()
+            thumbnail, _, _ = make_thumbnail(data, args.max_dimension, fmt, args.quality)
+            timings.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(thumbnail))
+        page = page_bytes(sizes, args.page_size)
+        formats[fmt] = {
+            "bytes_per_image": summarize(sizes),
+            "thumbnail_ms": summarize(timings),
+            "page_bytes": page,
+            "reduction_vs_originals": round(1 - page / original_page, 4) if original_page else 0.0,
+        }
+
+    results = {
+        "images": len(originals),
+        "page_size": args.page_size,
+        "max_dimension": args.max_dimension,
+        "quality": args.quality,
+        "cache_control": IMMUTABLE_CACHE_CONTROL,
+        "original_bytes_per_image": summarize(original_sizes),
+        "page_bytes_originals": original_page,
+        "thumbnails": formats,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
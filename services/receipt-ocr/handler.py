@@ -2,11 +2,22 @@ import boto3
 import base64
 import google.generativeai as genai
 import os
-import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import json
+import math
 import re
+import uuid
 import datetime
 import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ocr_cache import OcrCache, content_hash
+from image_prep import (prepare_image, describe, make_thumbnail, thumbnail_key, is_thumbnail_key,
+                        THUMBNAIL_ENABLED, IMMUTABLE_CACHE_CONTROL)
+from metrics import (span, RECORDS_PROCESSED, RECORDS_FAILED, PAYLOAD_BYTES, VISION_CALLS, VISION_TOKENS,
+                     VISION_FALLBACKS)
 
 REGION = "ap-south-1"
 S3_ENDPOINT = os.getenv('S3_ENDPOINT')
@@ -18,6 +29,28 @@ DB_CONFIG = {
     "port": os.getenv('POSTGRES_PORT', 5432)
 }
 
+# Upper bound on records fetched and sent to the vision model at the same time
+MAX_WORKERS = int(os.getenv('OCR_MAX_WORKERS', 8))
+# "gemini" for the hosted model, "stub" for the local deterministic model in stub_model.py
+VISION_BACKEND = os.getenv('VISION_BACKEND', 'gemini')
+# Receipt images packed into one vision request; 1 sends every image on its own
+VISION_BATCH_SIZE = int(os.getenv('OCR_VISION_BATCH_SIZE', 1))
+# Connections kept open by the shared Postgres pool
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+# Redis shared with the backend API response cache; new receipts invalidate the user's cached stats
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+CACHE_KEY_PREFIX = "expensa:cache"
+
+RECEIPT_FIELDS = ('total_amount', 'vendor_name', 'receipt_date')
+
+PROMPT_REQUIREMENTS = '''Requirements:
+- Convert all dates to YYYY-MM-DD format regardless of input format
+- Exclude currency symbol such as ₹ from total amount always
+- Extract the final paid amount including tax
+- Include full business name without abbreviations where possible
+- In case any of the other data is unavailable, return None as its value'''
+
 PROMPT = '''Extract the following information from the receipt image and return ONLY a JSON object with these fields
 {
    "total_amount": "amount in the format X.XX",
@@ -25,64 +58,328 @@ PROMPT = '''Extract the following information from the receipt image and return
    "receipt_date": "date in YYYY-MM-DD format"
 }
 
-Requirements:
-- Convert all dates to YYYY-MM-DD format regardless of input format
-- Exclude currency symbol such as ₹ from total amount always
-- Extract the final paid amount including tax
-- Include full business name without abbreviations where possible
-- In case any of the other data is unavailable, return None as its value'''
+''' + PROMPT_REQUIREMENTS
+
+# Each image in a batch follows a BATCH_KEY_LABEL line naming its S3 object key
+BATCH_KEY_LABEL = 'Receipt key: '
+
+BATCH_PROMPT = '''Each image above is a separate receipt, preceded by a line "Receipt key: <key>".
+Extract the following information from every receipt and return ONLY a JSON array with one object per receipt, in the same order
+[
+  {
+   "key": "the receipt key given before the image",
+   "total_amount": "amount in the format X.XX",
+   "vendor_name": "full business name",
+   "receipt_date": "date in YYYY-MM-DD format"
+  }
+]
+
+''' + PROMPT_REQUIREMENTS
+
+
+def init_vision_model():
+    """Initialize the vision model selected by VISION_BACKEND"""
+    if VISION_BACKEND == 'stub':
+        from stub_model import StubVisionModel
+        return StubVisionModel()
+
+    genai.configure(api_key=os.getenv("API_KEY"))
+    return genai.GenerativeModel(model_name="gemini-2.0-flash")
 
 
 def init_services():
     """Initialize AWS and Gemini services"""
-    genai.configure(api_key=os.getenv("API_KEY"))
     return (
         # boto3.client('s3', region_name=REGION),  # Replace below S3 config with this if deploying as Lambda container image
         boto3.client('s3', region_name=REGION,
                     aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
                     aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
                     endpoint_url=os.getenv('S3_ENDPOINT')),
-        genai.GenerativeModel(model_name="gemini-2.0-flash")
+        init_vision_model()
     )
 
 
-def process_image(model, image_data):
+class ServiceContext:
+    """Clients shared by every invocation handled by this process.
+
+    Built once on cold start and kept at module level so warm Lambda invocations
+    and repeated /event calls reuse the S3 client, the model and pooled DB connections.
+    """
+
+    def __init__(self, s3_client=None, vision_model=None, pool_min=DB_POOL_MIN, pool_max=DB_POOL_MAX):
+        if s3_client is None or vision_model is None:
+            default_s3, default_model = init_services()
+            s3_client = s3_client or default_s3
+            vision_model = vision_model or default_model
+        self.s3_client = s3_client
+        self.vision_model = vision_model
+        self.db_pool = ThreadedConnectionPool(pool_min, pool_max, **DB_CONFIG)
+        # ThreadedConnectionPool raises PoolError when exhausted instead of waiting; callers queue here
+        self._checkout_slots = threading.BoundedSemaphore(pool_max)
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.created_at = time.time()
+
+        self._lock = threading.Lock()
+        self._seen_connections = set()
+        self.invocations = 0
+        self.db_checkouts = 0
+        self.db_checkout_waits = 0
+        self.db_connections_opened = 0
+
+        self.ocr_cache = OcrCache(self.connection)
+        self.ocr_cache.purge_expired()
+
+        self.cache_client = None
+        if CACHE_REDIS_URL:
+            import redis
+            self.cache_client = redis.Redis.from_url(CACHE_REDIS_URL)
+
+    def record_invocation(self):
+        with self._lock:
+            self.invocations += 1
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, discarding it if it was closed while in use.
+
+        Blocks until a connection is returned when all pool_max are checked out.
+        """
+        if not self._checkout_slots.acquire(blocking=False):
+            with self._lock:
+                self.db_checkout_waits += 1
+            self._checkout_slots.acquire()
+        try:
+            conn = self.db_pool.getconn()
+        except Exception:
+            self._checkout_slots.release()
+            raise
+        with self._lock:
+            self.db_checkouts += 1
+            if id(conn) not in self._seen_connections:
+                self._seen_connections.add(id(conn))
+                self.db_connections_opened += 1
+        try:
+            yield conn
+        finally:
+            self.db_pool.putconn(conn, close=bool(conn.closed))
+            self._checkout_slots.release()
+
+    def invalidate_user_caches(self, user_ids):
+        """Bump the backend API's per-user cache generation so cached stats and lists are refetched"""
+        if self.cache_client is None:
+            return
+        try:
+            for user_id in user_ids:
+                self.cache_client.incr(f"{CACHE_KEY_PREFIX}:{user_id}:gen")
+        except Exception as e:
+            print(f"Error invalidating API cache: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "initialized": True,
+                "uptime_seconds": round(time.time() - self.created_at, 3),
+                "invocations": self.invocations,
+                "client_reuses": max(self.invocations - 1, 0),
+                "db_pool": {
+                    "min": self.pool_min,
+                    "max": self.pool_max,
+                    "checkouts": self.db_checkouts,
+                    "checkout_waits": self.db_checkout_waits,
+                    "connections_opened": self.db_connections_opened,
+                    "connection_reuses": self.db_checkouts - self.db_connections_opened,
+                },
+                "ocr_cache": self.ocr_cache.stats(),
+            }
+
+    def close(self):
+        self.db_pool.closeall()
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def get_services():
+    """Return the process-wide ServiceContext, creating it on first use"""
+    global _services
+    with _services_lock:
+        if _services is None:
+            _services = ServiceContext()
+        return _services
+
+
+def service_stats():
+    """Reuse counters of the shared ServiceContext without creating it"""
+    if _services is None:
+        return {"initialized": False}
+    return _services.stats()
+
+
+def process_image(model, image_data, mime_type='image/jpeg'):
     """Process receipt image using Gemini Vision API"""
     return model.generate_content([{
-        'mime_type': 'image/jpeg',
+        'mime_type': mime_type,
         'data': base64.b64encode(image_data).decode('utf-8')
     }, PROMPT])
 
 
+def process_image_batch(model, images):
+    """Send several (object_key, data, mime_type) receipt images in one Gemini Vision request"""
+    contents = []
+    for object_key, image_data, mime_type in images:
+        contents.append(BATCH_KEY_LABEL + object_key)
+        contents.append({'mime_type': mime_type, 'data': base64.b64encode(image_data).decode('utf-8')})
+    contents.append(BATCH_PROMPT)
+    return model.generate_content(contents)
+
+
+def record_usage(response, mode):
+    VISION_CALLS.labels(mode=mode).inc()
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        VISION_TOKENS.labels(kind='prompt').inc(usage.prompt_token_count or 0)
+        VISION_TOKENS.labels(kind='output').inc(usage.candidates_token_count or 0)
+
+
+_json_decoder = json.JSONDecoder()
+_json_start = re.compile(r'[\[{]')
+
+
+def iter_json_values(text):
+    """Yield every top-level JSON object or array in text.
+
+    Model output wraps JSON in code fences and prose, which can hold braces of its own, so each
+    candidate is decoded in place and skipped when it does not parse.
+    """
+    position = 0
+    while match := _json_start.search(text, position):
+        try:
+            value, position = _json_decoder.raw_decode(text, match.start())
+        except ValueError:
+            position = match.start() + 1
+            continue
+        yield value
+
+
+def is_receipt(data):
+    return isinstance(data, dict) and any(field in data for field in RECEIPT_FIELDS)
+
+
 def extract_receipt_data(response_text):
     """Parse structured data from API response"""
-    json_str = re.search(r'{.*}', response_text, re.DOTALL).group()
-    return json.loads(json_str)
+    for value in iter_json_values(response_text):
+        for data in value if isinstance(value, list) else [value]:
+            if is_receipt(data):
+                return data
+    raise ValueError("No receipt JSON object in the model response")
+
+
+def extract_batch_results(response_text, object_keys):
+    """Map a batched response back to its object keys.
+
+    Entries are matched on their "key" field, or by position when none of them carries a known key
+    and the counts agree. Receipts that are missing or malformed are left out for the caller to retry.
+    """
+    entries = []
+    for value in iter_json_values(response_text):
+        entries.extend(value if isinstance(value, list) else [value])
+    entries = [entry for entry in entries if is_receipt(entry)]
+
+    wanted = set(object_keys)
+    results = {}
+    for entry in entries:
+        key = entry.get('key')
+        if key in wanted and key not in results:
+            results[key] = {name: value for name, value in entry.items() if name != 'key'}
+    if not results and len(entries) == len(object_keys):
+        results = {
+            key: {name: value for name, value in entry.items() if name != 'key'}
+            for key, entry in zip(object_keys, entries)
+        }
+    return results
 
 
-def prepare_db_data(object_key, data, metadata):
-    """Format data for database insertion"""
+# What the model returns for a field it could not read; PROMPT_REQUIREMENTS asks for None
+MISSING_VALUES = (None, '', 'None', 'none', 'null', 'N/A')
+# Column limits of the receipts table
+MAX_CATEGORY_LENGTH = 20
+MAX_VENDOR_LENGTH = 255
+MAX_TOTAL_AMOUNT = 99999999.99
+
+
+def prepare_db_data(object_key, data, metadata, thumbnail_url=None):
+    """Format data for database insertion.
+
+    Raises ValueError for a record the receipts table would reject, so it fails on its own
+    instead of failing the multi-row INSERT of its whole batch.
+    """
     receipt_id = object_key.split('_')[0]
-    receipt_date = data.get('receipt_date', datetime.date.fromtimestamp(time.time()).isoformat())
-    total_amount = data.get('total_amount', '0').replace('₹', '').strip()
-    vendor_name = data.get('vendor_name', 'Unknown')
+    user_id = metadata.get('user')
+    category = metadata.get('category', 'work')
+    try:
+        uuid.UUID(receipt_id)
+        uuid.UUID(user_id or '')
+    except ValueError:
+        raise ValueError(f"Object {object_key} needs a receipt UUID key prefix and a user UUID in its metadata")
+    if len(category) > MAX_CATEGORY_LENGTH:
+        raise ValueError(f"Category {category!r} is longer than {MAX_CATEGORY_LENGTH} characters")
+
+    receipt_date = data.get('receipt_date')
+    if receipt_date in MISSING_VALUES:
+        receipt_date = datetime.date.fromtimestamp(time.time()).isoformat()
+    else:
+        try:
+            receipt_date = datetime.date.fromisoformat(str(receipt_date).strip()).isoformat()
+        except ValueError:
+            raise ValueError(f"Unreadable receipt_date {receipt_date!r}")
+
+    total_amount = data.get('total_amount')
+    if total_amount in MISSING_VALUES:
+        total_amount = 0.0
+    else:
+        try:
+            total_amount = round(float(str(total_amount).replace('₹', '').replace(',', '').strip()), 2)
+        except ValueError:
+            raise ValueError(f"Unreadable total_amount {total_amount!r}")
+        if not math.isfinite(total_amount) or abs(total_amount) > MAX_TOTAL_AMOUNT:
+            raise ValueError(f"total_amount {total_amount!r} is out of range")
+
+    vendor_name = data.get('vendor_name')
+    vendor_name = 'Unknown' if vendor_name in MISSING_VALUES else str(vendor_name).strip()[:MAX_VENDOR_LENGTH]
     s3_url = S3_ENDPOINT + object_key
 
-    return (receipt_id, metadata.get('user'), metadata.get('category', 'work'),
-            receipt_date, vendor_name, float(total_amount), s3_url)
+    return (receipt_id, user_id, category, receipt_date, vendor_name, total_amount, s3_url, thumbnail_url)
 
 
-def insert_receipt(conn, values):
-    """Insert receipt data into PostgreSQL"""
+# Events can be delivered more than once (S3 notifications, ocr_jobs redelivery), so a repeat is a no-op.
+# The receipts key is (receipt_id, receipt_date) and a repeat may read a different date, so a receipt
+# is only inserted if its receipt_id could be claimed in the unpartitioned ocr_receipts table.
+INSERT_QUERY = """
+                WITH v (receipt_id, user_id, category, receipt_date, vendor_name, total_amount, s3_url, thumbnail_url) AS (
+                    VALUES %s
+                ), claimed AS (
+                    INSERT INTO ocr_receipts (receipt_id)
+                    SELECT DISTINCT receipt_id::uuid FROM v
+                    ON CONFLICT DO NOTHING
+                    RETURNING receipt_id
+                )
+                INSERT INTO receipts (receipt_id, user_id, category, receipt_date, vendor_name, total_amount, s3_url, thumbnail_url)
+                SELECT DISTINCT ON (claimed.receipt_id) claimed.receipt_id, v.user_id::uuid, v.category, v.receipt_date::date,
+                       v.vendor_name, v.total_amount, v.s3_url, v.thumbnail_url
+                FROM v JOIN claimed ON claimed.receipt_id = v.receipt_id::uuid
+                ON CONFLICT DO NOTHING
+            """
+
+
+def insert_receipts(conn, rows):
+    """Insert a batch of receipts into PostgreSQL with a single multi-row INSERT"""
     cursor = conn.cursor()
-    insert_query = """
-                    INSERT INTO receipts (receipt_id, user_id, category, receipt_date, vendor_name, total_amount, s3_url)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
     try:
-        cursor.execute(insert_query, values)
+        execute_values(cursor, INSERT_QUERY, rows, page_size=max(len(rows), 1))
         conn.commit()
-        print("Successfully created record in DB")
+        print(f"Successfully created {cursor.rowcount} record(s) in DB, {len(rows) - cursor.rowcount} already stored")
     except Exception as e:
         conn.rollback()
         raise e
@@ -90,33 +387,289 @@ def insert_receipt(conn, values):
         cursor.close()
 
 
-def lambda_handler(event, context=None):
-    """Process S3 events and store receipt data"""
-    s3_client, vision_model = init_services()
+def insert_receipt(conn, values):
+    """Insert receipt data into PostgreSQL"""
+    insert_receipts(conn, [values])
 
-    for record in event['Records']:
-        bucket_name = record['s3']['bucket']['name']
-        object_key = record['s3']['object']['key']
 
+def store_receipts(conn, rows):
+    """insert_receipts for {object_key: row}, retrying each row on its own when the batch INSERT fails.
+
+    Returns {object_key: exception} for the rows that could not be stored.
+    """
+    try:
+        insert_receipts(conn, list(rows.values()))
+        return {}
+    except Exception as e:
+        if len(rows) == 1:
+            return {object_key: e for object_key in rows}
+        print(f"Batch insert of {len(rows)} receipts failed, inserting them one by one: {str(e)}")
+
+    errors = {}
+    for object_key, row in rows.items():
         try:
-            # Get image from S3
-            response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-            print(f"Successfully retrieved image from S3.")
-            image_data = response['Body'].read()
+            insert_receipt(conn, row)
+        except Exception as e:
+            errors[object_key] = e
+    return errors
+
+
+def store_thumbnail(s3_client, bucket_name, object_key, image_data):
+    """Write the list-view thumbnail of an S3 object under its derived key and return its URL.
+
+    Thumbnails are public like the originals and cached as immutable. A receipt is still stored
+    when its thumbnail cannot be made, so failures are logged and return None.
+    """
+    key = thumbnail_key(object_key)
+    try:
+        with span('thumbnail', key=object_key, bytes=len(image_data)):
+            data, mime_type, size = make_thumbnail(image_data)
+            s3_client.put_object(Bucket=bucket_name, Key=key, Body=data, ContentType=mime_type,
+                                 CacheControl=IMMUTABLE_CACHE_CONTROL, ACL='public-read')
+    except Exception as e:
+        print(f"Error creating thumbnail for {object_key}: {str(e)}")
+        return None
+    PAYLOAD_BYTES.labels(direction='thumbnail').inc(len(data))
+    print(f"Stored thumbnail {key}: {len(image_data)} -> {len(data)} bytes, {size[0]}x{size[1]}")
+    return S3_ENDPOINT + key
+
+
+def load_record(services, record):
+    """Fetch a single S3 object and write its thumbnail.
+
+    Returns the record's state for lookup_cached, prepare_record and finish_record, with the
+    original image bytes in image and receipt_data still None.
+    """
+    bucket_name = record['s3']['bucket']['name']
+    object_key = record['s3']['object']['key']
+
+    # Get image from S3
+    with span('get_object', key=object_key):
+        response = services.s3_client.get_object(Bucket=bucket_name, Key=object_key)
+        image_data = response['Body'].read()
+    PAYLOAD_BYTES.labels(direction='s3_object').inc(len(image_data))
+
+    thumbnail_url = None
+    if THUMBNAIL_ENABLED:
+        thumbnail_url = store_thumbnail(services.s3_client, bucket_name, object_key, image_data)
+
+    return {
+        "key": object_key,
+        "metadata": response['Metadata'],
+        "image_hash": content_hash(image_data),
+        "thumbnail_url": thumbnail_url,
+        "receipt_data": None,
+        "image": image_data,
+    }
+
+
+def lookup_cached(services, states):
+    """Reuse the parsed result of identical images, reading the OCR cache on one pooled connection"""
+    try:
+        with services.connection() as conn, span('ocr_cache_get', records=len(states)):
+            cached = services.ocr_cache.get_many(conn, [state['image_hash'] for state in states])
+    except Exception as e:
+        # Without the cache every record goes to the vision model
+        print(f"Error reading OCR cache for {len(states)} records: {str(e)}")
+        cached = {}
+    for state in states:
+        state['receipt_data'] = cached.get(state['image_hash'])
+
+
+def prepare_record(state):
+    """The (object_key, data, mime_type) to send to the vision model for a record the cache missed"""
+    object_key, image_data = state['key'], state['image']
+    # Downscale and strip metadata first; the cache stays keyed on the original bytes
+    with span('preprocess_image', key=object_key, bytes=len(image_data)):
+        prepared_data, mime_type, prep_stats = prepare_image(image_data)
+    print(f"Prepared {object_key}: {describe(prep_stats)}")
+    PAYLOAD_BYTES.labels(direction='vision_request').inc(len(prepared_data))
+    return object_key, prepared_data, mime_type
 
-            # Process with Vision API
-            vision_response = process_image(vision_model, image_data)
-            print(f"Successfully processed image with Gemini API.")
-            receipt_data = extract_receipt_data(vision_response.text)
 
-            # Store in database
-            db_values = prepare_db_data(object_key, receipt_data, response['Metadata'])
-            with psycopg2.connect(**DB_CONFIG) as conn:
-                insert_receipt(conn, db_values)
+def recognize_receipt(model, object_key, image_data, mime_type):
+    """Extract the receipt data of one image with its own vision call"""
+    with span('process_image', key=object_key, bytes=len(image_data)):
+        vision_response = process_image(model, image_data, mime_type)
+    record_usage(vision_response, 'single')
+    with span('extract_receipt_data', key=object_key):
+        return extract_receipt_data(vision_response.text)
 
+
+def recognize_batch(model, images):
+    """Extract the receipt data of several (object_key, data, mime_type) images with one vision call.
+
+    Receipts the batched response leaves out or garbles are retried with a single-image call each.
+    Returns {object_key: receipt data, or the exception of its failed single-image call}.
+    """
+    if len(images) == 1:
+        object_key, image_data, mime_type = images[0]
+        try:
+            return {object_key: recognize_receipt(model, object_key, image_data, mime_type)}
         except Exception as e:
-            error_msg = f"Error processing receipt {object_key}: {str(e)}"
-            return {"statusCode": 500, "body": json.dumps(error_msg)}
+            return {object_key: e}
+
+    results = {}
+    try:
+        with span('process_image_batch', images=len(images), bytes=sum(len(data) for _, data, _ in images)):
+            vision_response = process_image_batch(model, images)
+        record_usage(vision_response, 'batch')
+        with span('extract_batch_results', images=len(images)):
+            results = extract_batch_results(vision_response.text, [object_key for object_key, _, _ in images])
+    except Exception as e:
+        print(f"Error in batched vision call for {len(images)} receipts: {str(e)}")
+
+    for object_key, image_data, mime_type in images:
+        if object_key in results:
+            continue
+        print(f"No usable result for {object_key} in the batched response, retrying it on its own")
+        VISION_FALLBACKS.inc()
+        try:
+            results[object_key] = recognize_receipt(model, object_key, image_data, mime_type)
+        except Exception as e:
+            results[object_key] = e
+    return results
+
+
+def recognize_receipts(model, images, executor, batch_size=VISION_BATCH_SIZE):
+    """recognize_batch over (object_key, data, mime_type) images, batch_size at a time, with the calls run on executor"""
+    batch_size = max(1, batch_size)
+    batches = [images[n:n + batch_size] for n in range(0, len(images), batch_size)]
+    results = {}
+    for recognized in executor.map(lambda batch: recognize_batch(model, batch), batches):
+        results.update(recognized)
+    return results
+
+
+def finish_record(state):
+    with span('prepare_db_data', key=state['key']):
+        return prepare_db_data(state['key'], state['receipt_data'], state['metadata'], state['thumbnail_url'])
+
+
+def process_batched(services, records, executor, batch_size):
+    """Fetch many S3 objects and extract their receipt data, packing batch_size images into each vision call.
+
+    Returns ({object_key: row to insert, or the exception that stopped the record},
+    {image_hash: receipt data} for the OCR cache entries to write). Results that do not make a
+    valid row are not cached, so a retry asks the vision model again.
+    """
+    outcomes = {}
+    states = {}
+    futures = {executor.submit(load_record, services, record): record['s3']['object']['key'] for record in records}
+    for future in as_completed(futures):
+        try:
+            state = future.result()
+            states[state['key']] = state
+        except Exception as e:
+            outcomes[futures[future]] = e
+
+    if states:
+        lookup_cached(services, list(states.values()))
+
+    images = list(executor.map(prepare_record, [state for state in states.values() if state['receipt_data'] is None]))
+    recognized_keys = set()
+    for object_key, receipt_data in recognize_receipts(services.vision_model, images, executor, batch_size).items():
+        if isinstance(receipt_data, Exception):
+            outcomes[object_key] = receipt_data
+            continue
+        states[object_key]['receipt_data'] = receipt_data
+        recognized_keys.add(object_key)
+
+    recognized = {}
+    for object_key, state in states.items():
+        if object_key not in outcomes:
+            try:
+                outcomes[object_key] = finish_record(state)
+            except Exception as e:
+                outcomes[object_key] = e
+                continue
+            if object_key in recognized_keys:
+                recognized[state['image_hash']] = state['receipt_data']
+    return outcomes, recognized
+
+
+def process_records(records, services, max_workers=MAX_WORKERS, batch_size=VISION_BATCH_SIZE):
+    """Run S3 fetches and vision calls concurrently, then store all parsed receipts in one batch.
+
+    The OCR cache is read and written, and the receipts inserted, on one pooled connection at a
+    time rather than one per worker thread. With batch_size above 1, up to that many images share
+    each vision call (see recognize_batch).
+    Returns a per-record report of the form {"key": ..., "status": "ok" | "error", "error": ...}.
+    Events for the worker's own thumbnails are reported as ok without being processed.
+    """
+    results = {}
+    rows = {}
+
+    for record in records:
+        object_key = record['s3']['object']['key']
+        if is_thumbnail_key(object_key):
+            results[object_key] = {"key": object_key, "status": "ok", "skipped": True}
+    records_to_process = [record for record in records if record['s3']['object']['key'] not in results]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(records_to_process) or 1))) as executor:
+        outcomes, recognized = process_batched(services, records_to_process, executor, batch_size)
+
+    for object_key, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            print(f"Error processing receipt {object_key}: {str(outcome)}")
+            results[object_key] = {"key": object_key, "status": "error", "error": str(outcome)}
+        else:
+            rows[object_key] = outcome
+
+    if rows or recognized:
+        errors = {}
+        try:
+            with services.connection() as conn:
+                with span('ocr_cache_put', entries=len(recognized)):
+                    services.ocr_cache.put_many(conn, recognized)
+                if rows:
+                    with span('insert_receipts', rows=len(rows)):
+                        errors = store_receipts(conn, rows)
+        except Exception as e:
+            errors = {object_key: e for object_key in rows}
+
+        for object_key in rows:
+            if object_key in errors:
+                print(f"Error storing receipt {object_key}: {str(errors[object_key])}")
+                results[object_key] = {"key": object_key, "status": "error",
+                                       "error": f"Database error: {str(errors[object_key])}"}
+            else:
+                print(f"Successfully processed {object_key}")
+                results[object_key] = {"key": object_key, "status": "ok"}
+        stored_users = {row[1] for object_key, row in rows.items() if object_key not in errors}
+        if stored_users:
+            services.invalidate_user_caches(stored_users)
+
+    failed = sum(1 for result in results.values() if result["status"] != "ok")
+    skipped = len(records) - len(records_to_process)
+    RECORDS_PROCESSED.inc(len(results) - failed - skipped)
+    RECORDS_FAILED.inc(failed)
+
+    # Report in the order records arrived in the event
+    return [results[record['s3']['object']['key']] for record in records]
+
+
+def lambda_handler(event, context=None):
+    """Process S3 events and store receipt data"""
+    services = get_services()
+    services.record_invocation()
+
+    results = process_records(event['Records'], services)
+    failed = sum(1 for result in results if result["status"] != "ok")
+    skipped = sum(1 for result in results if result.get("skipped"))
 
-    return {"statusCode": 200, "body": json.dumps("Processing complete")}
+    if not failed:
+        status_code = 200
+    elif failed == len(results):
+        status_code = 500
+    else:
+        status_code = 207
 
+    body = {
+        "message": "Processing complete",
+        "processed": len(results) - failed - skipped,
+        "failed": failed,
+        "skipped": skipped,
+        "records": results,
+    }
+    return {"statusCode": status_code, "body": json.dumps(body)}
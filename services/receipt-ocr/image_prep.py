@@ -0,0 +1,154 @@
+import io
+import os
+import time
+
+from PIL import Image, ImageOps
+
+# Set to false to send the original S3 object bytes to the vision model
+PREPROCESS_ENABLED = os.getenv('OCR_IMAGE_PREPROCESS', 'true').lower() == 'true'
+# Longest side, in pixels, of the image sent to the vision model
+MAX_DIMENSION = int(os.getenv('OCR_IMAGE_MAX_DIMENSION', 1600))
+# JPEG quality of the re-encoded image
+JPEG_QUALITY = int(os.getenv('OCR_IMAGE_JPEG_QUALITY', 80))
+# Receipts are read for their text, so colour is dropped by default
+GRAYSCALE = os.getenv('OCR_IMAGE_GRAYSCALE', 'true').lower() == 'true'
+
+# Set to false to stop writing list-view thumbnails next to the original S3 object
+THUMBNAIL_ENABLED = os.getenv('OCR_THUMBNAIL', 'true').lower() == 'true'
+# Longest side, in pixels, of the thumbnail
+THUMBNAIL_MAX_DIMENSION = int(os.getenv('OCR_THUMBNAIL_MAX_DIMENSION', 320))
+# webp or jpeg
+THUMBNAIL_FORMAT = os.getenv('OCR_THUMBNAIL_FORMAT', 'webp').lower()
+THUMBNAIL_QUALITY = int(os.getenv('OCR_THUMBNAIL_QUALITY', 70))
+# Thumbnails are written under this prefix in the same bucket; the worker ignores events for keys under it
+THUMBNAIL_PREFIX = os.getenv('OCR_THUMBNAIL_PREFIX', 'thumbnails/')
+# Thumbnail keys are derived from receipt keys, which embed a fresh receipt_id, so an object never changes
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+THUMBNAIL_TYPES = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+}
+
+# Leading bytes of the formats S3 uploads are expected to hold
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+def detect_mime_type(image_data):
+    """Sniff the image format from its magic bytes, defaulting to image/jpeg"""
+    for signature, mime_type in SIGNATURES:
+        if image_data.startswith(signature):
+            return mime_type
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'image/webp'
+    if image_data[4:8] == b'ftyp' and image_data[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'image/heic'
+    return 'image/jpeg'
+
+
+def preprocess_image(image_data, max_dimension=MAX_DIMENSION, quality=JPEG_QUALITY, grayscale=GRAYSCALE):
+    """Downscale and re-encode an image for the vision model.
+
+    The image is rotated upright from its EXIF orientation, shrunk so its longest side is at most
+    max_dimension, optionally converted to grayscale and saved as a JPEG without any metadata.
+    Returns (data, mime_type, stats). Images Pillow cannot decode are returned unchanged with
+    their detected type.
+    """
+    timings = {}
+    start = time.perf_counter()
+    mime_type = detect_mime_type(image_data)
+    timings['detect_ms'] = (time.perf_counter() - start) * 1000
+    stats = {"bytes_before": len(image_data), "mime_type_before": mime_type, "timings_ms": timings}
+
+    try:
+        stage = time.perf_counter()
+        image = Image.open(io.BytesIO(image_data))
+        original_size = image.size
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is far cheaper than a full decode and resize
+        scale = min(1.0, max_dimension / max(original_size))
+        image.draft('L' if grayscale else 'RGB', (round(original_size[0] * scale), round(original_size[1] * scale)))
+        image = ImageOps.exif_transpose(image)
+        timings['decode_ms'] = (time.perf_counter() - stage) * 1000
+
+        stage = time.perf_counter()
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        image = image.convert('L' if grayscale else 'RGB')
+        timings['resize_ms'] = (time.perf_counter() - stage) * 1000
+
+        stage = time.perf_counter()
+        output = io.BytesIO()
+        # A fresh save carries no EXIF, XMP or ICC data unless it is passed in explicitly
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+        data = output.getvalue()
+        timings['encode_ms'] = (time.perf_counter() - stage) * 1000
+    except Exception as e:
+        stats.update({"bytes_after": len(image_data), "mime_type": mime_type, "preprocessed": False, "error": str(e)})
+        return image_data, mime_type, stats
+
+    timings['total_ms'] = (time.perf_counter() - start) * 1000
+    stats.update({
+        "bytes_after": len(data),
+        "mime_type": 'image/jpeg',
+        "preprocessed": True,
+        "size_before": list(original_size),
+        "size_after": list(image.size),
+    })
+    return data, 'image/jpeg', stats
+
+
+def thumbnail_key(object_key, fmt=THUMBNAIL_FORMAT, prefix=THUMBNAIL_PREFIX):
+    """Derived S3 key of an object's thumbnail, e.g. <receipt_id>_photo.jpg -> thumbnails/<receipt_id>_photo.webp"""
+    return prefix + os.path.splitext(object_key)[0] + THUMBNAIL_TYPES[fmt][2]
+
+
+def is_thumbnail_key(object_key, prefix=THUMBNAIL_PREFIX):
+    return object_key.startswith(prefix)
+
+
+def make_thumbnail(image_data, max_dimension=THUMBNAIL_MAX_DIMENSION, fmt=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY):
+    """Small upright colour preview of a receipt for list views.
+
+    Decoded the same way as preprocess_image, but kept in colour and saved as WebP or JPEG
+    without metadata. Returns (data, mime_type, size). Raises when Pillow cannot decode the image.
+    """
+    pil_format, mime_type, _ = THUMBNAIL_TYPES[fmt]
+    image = Image.open(io.BytesIO(image_data))
+    scale = min(1.0, max_dimension / max(image.size))
+    image.draft('RGB', (round(image.size[0] * scale), round(image.size[1] * scale)))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    image = image.convert('RGB')
+
+    output = io.BytesIO()
+    if pil_format == 'WEBP':
+        image.save(output, format='WEBP', quality=quality, method=4)
+    else:
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue(), mime_type, image.size
+
+
+def prepare_image(image_data):
+    """Apply preprocess_image when OCR_IMAGE_PREPROCESS is on; otherwise only detect the real type"""
+    if PREPROCESS_ENABLED:
+        return preprocess_image(image_data)
+    mime_type = detect_mime_type(image_data)
+    return image_data, mime_type, {"bytes_before": len(image_data), "bytes_after": len(image_data),
+                                   "mime_type": mime_type, "preprocessed": False}
+
+
+def describe(stats):
+    """One-line summary of a preprocess_image result for the worker log"""
+    summary = f"{stats['bytes_before']} -> {stats['bytes_after']} bytes"
+    if stats.get("preprocessed"):
+        width, height = stats["size_before"]
+        new_width, new_height = stats["size_after"]
+        timings = ", ".join(f"{name.removesuffix('_ms')} {value:.1f}ms" for name, value in stats["timings_ms"].items())
+        summary += f", {width}x{height} -> {new_width}x{new_height}, {timings}"
+    elif stats.get("error"):
+        summary += f", sent as-is ({stats['error']})"
+    return summary
@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+
+from psycopg2.extras import execute_values
+from handler import get_services, process_records
+from work_queue import QueueFull
+from metrics import RECORDS_RETRIED, RECORDS_DEAD_LETTERED
+
+# "push" keeps /event on the in-memory WorkQueue, "poll" stores events in ocr_jobs and pulls them from there
+RUN_MODE = os.getenv('OCR_RUN_MODE', 'push')
+# Pollers in this process, each claiming up to JOB_BATCH_SIZE jobs at a time
+JOB_WORKERS = int(os.getenv('OCR_JOB_WORKERS', 2))
+JOB_BATCH_SIZE = int(os.getenv('OCR_JOB_BATCH_SIZE', 8))
+# Seconds a claimed job stays hidden from other pollers before it is handed out again
+JOB_VISIBILITY_TIMEOUT = int(os.getenv('OCR_JOB_VISIBILITY_TIMEOUT', 300))
+# Attempts before a job is moved to ocr_jobs_dead
+JOB_MAX_ATTEMPTS = int(os.getenv('OCR_JOB_MAX_ATTEMPTS', 5))
+# Retry delay doubles from JOB_BACKOFF_BASE up to JOB_BACKOFF_MAX seconds
+JOB_BACKOFF_BASE = float(os.getenv('OCR_JOB_BACKOFF_BASE', 2))
+JOB_BACKOFF_MAX = float(os.getenv('OCR_JOB_BACKOFF_MAX', 600))
+# Seconds an idle poller sleeps before asking for work again
+JOB_POLL_INTERVAL = float(os.getenv('OCR_JOB_POLL_INTERVAL', 1))
+
+CLAIM_QUERY = """
+    WITH next AS (
+        SELECT job_id FROM ocr_jobs
+        WHERE visible_at <= now()
+        ORDER BY visible_at, job_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE ocr_jobs AS jobs
+    SET attempts = jobs.attempts + 1,
+        visible_at = now() + make_interval(secs => %s)
+    FROM next
+    WHERE jobs.job_id = next.job_id
+    RETURNING jobs.job_id, jobs.record, jobs.attempts
+"""
+
+DEAD_LETTER_QUERY = """
+    WITH dead AS (
+        DELETE FROM ocr_jobs WHERE job_id = %s
+        RETURNING job_id, record, attempts, created_at
+    )
+    INSERT INTO ocr_jobs_dead (job_id, record, attempts, last_error, created_at)
+    SELECT job_id, record, attempts, %s, created_at FROM dead
+"""
+
+
+def backoff_seconds(attempts, base=JOB_BACKOFF_BASE, cap=JOB_BACKOFF_MAX):
+    """Exponential delay before the next attempt, with jitter so failed batches do not retry in lockstep"""
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    """Durable queue of S3 event records stored in the ocr_jobs table.
+
+    Pollers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers in
+    any number of processes can share the table. A claimed job is hidden for the visibility
+    timeout; if the worker dies it becomes visible again and is retried. Failed records are
+    retried with exponential backoff and moved to ocr_jobs_dead after max_attempts.
+    """
+
+    def __init__(self, services=None, batch_size=JOB_BATCH_SIZE, visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+                 max_attempts=JOB_MAX_ATTEMPTS):
+        self.services = services or get_services()
+        self.batch_size = batch_size
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+
+    def _execute(self, fn):
+        with self.services.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                result = fn(cursor)
+                conn.commit()
+                return result
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def enqueue(self, records):
+        """Store S3 event records as jobs; returns the number stored"""
+        if not records:
+            return 0
+        self._execute(lambda cursor: execute_values(
+            cursor,
+            "INSERT INTO ocr_jobs (record) VALUES %s",
+            [(json.dumps(record),) for record in records],
+            page_size=len(records),
+        ))
+        return len(records)
+
+    def claim(self, batch_size=None):
+        """Claim up to batch_size visible jobs as (job_id, record, attempts) tuples"""
+        def claim_jobs(cursor):
+            cursor.execute(CLAIM_QUERY, (batch_size or self.batch_size, self.visibility_timeout))
+            return cursor.fetchall()
+
+        return [
+            (job_id, record if isinstance(record, dict) else json.loads(record), attempts)
+            for job_id, record, attempts in self._execute(claim_jobs)
+        ]
+
+    def complete(self, job_ids):
+        if job_ids:
+            self._execute(lambda cursor: cursor.execute("DELETE FROM ocr_jobs WHERE job_id = ANY(%s)", (list(job_ids),)))
+
+    def fail(self, failures):
+        """Schedule a retry for each (job_id, attempts, error), or dead-letter jobs that ran out of attempts.
+
+        Returns (retried, dead_lettered).
+        """
+        retried = dead_lettered = 0
+
+        def record_failures(cursor):
+            nonlocal retried, dead_lettered
+            for job_id, attempts, error in failures:
+                if attempts >= self.max_attempts:
+                    cursor.execute(DEAD_LETTER_QUERY, (job_id, error))
+                    dead_lettered += 1
+                else:
+                    cursor.execute(
+                        """
+                        UPDATE ocr_jobs SET visible_at = now() + make_interval(secs => %s), last_error = %s
+                        WHERE job_id = %s
+                        """,
+                        (backoff_seconds(attempts), error, job_id),
+                    )
+                    retried += 1
+
+        if failures:
+            self._execute(record_failures)
+            RECORDS_RETRIED.inc(retried)
+            RECORDS_DEAD_LETTERED.inc(dead_lettered)
+        return retried, dead_lettered
+
+    def release(self, job_ids):
+        """Make claimed jobs visible again without counting the attempt"""
+        if job_ids:
+            self._execute(lambda cursor: cursor.execute(
+                "UPDATE ocr_jobs SET visible_at = now(), attempts = attempts - 1 WHERE job_id = ANY(%s)",
+                (list(job_ids),),
+            ))
+
+    def process_batch(self):
+        """Claim one batch, run it through the OCR pipeline and settle every job.
+
+        Each object key is processed once per batch. Further jobs for the same key are released
+        and run in a later batch, so each job is settled on its own result.
+        Returns counts for the batch, or None when no job was visible.
+        """
+        jobs = self.claim()
+        if not jobs:
+            return None
+
+        batch = {}
+        deferred = []
+        for job in jobs:
+            object_key = job[1]['s3']['object']['key']
+            if object_key in batch:
+                deferred.append(job[0])
+            else:
+                batch[object_key] = job
+
+        self.services.record_invocation()
+        reports = process_records([record for _, record, _ in batch.values()], self.services)
+        results = {report["key"]: report for report in reports}
+        settled = [(job, results[object_key]) for object_key, job in batch.items()]
+
+        self.complete([job_id for (job_id, _, _), result in settled if result["status"] == "ok"])
+        retried, dead_lettered = self.fail([
+            (job_id, attempts, result.get("error"))
+            for (job_id, _, attempts), result in settled
+            if result["status"] != "ok"
+        ])
+        self.release(deferred)
+        return {"claimed": len(jobs), "deferred": len(deferred), "retried": retried,
+                "dead_lettered": dead_lettered, "completed": len(batch) - retried - dead_lettered}
+
+    def requeue_dead(self):
+        """Move every dead-lettered job back to ocr_jobs with a fresh attempt count"""
+        def requeue(cursor):
+            cursor.execute(
+                """
+                WITH revived AS (DELETE FROM ocr_jobs_dead RETURNING record, created_at)
+                INSERT INTO ocr_jobs (record, created_at) SELECT record, created_at FROM revived
+                """
+            )
+            return cursor.rowcount
+
+        return self._execute(requeue)
+
+    def depth(self):
+        def count(cursor):
+            cursor.execute(
+                """
+                SELECT count(*) FILTER (WHERE visible_at <= now()),
+                       count(*) FILTER (WHERE visible_at > now()),
+                       (SELECT count(*) FROM ocr_jobs_dead)
+                FROM ocr_jobs
+                """
+            )
+            return cursor.fetchone()
+
+        ready, delayed, dead = self._execute(count)
+        return {"ready": ready, "in_flight_or_delayed": delayed, "dead": dead}
+
+
+class JobPoller:
+    """asyncio pollers pulling batches from a JobQueue, with the same start/drain/status surface as WorkQueue"""
+
+    def __init__(self, job_queue=None, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.job_queue = job_queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.accepting = False
+        self.claimed = 0
+        self.rejected = 0
+        self.deferred = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self._stopping = None
+        self._tasks = []
+
+    def start(self):
+        self.job_queue = self.job_queue or JobQueue()
+        self.accepting = True
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, records):
+        """Persist records as jobs; they are picked up by whichever poller gets to them first"""
+        if not self.accepting:
+            self.rejected += len(records)
+            raise QueueFull("Not accepting events while draining")
+        return await asyncio.to_thread(self.job_queue.enqueue, records)
+
+    async def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                batch = await asyncio.to_thread(self.job_queue.process_batch)
+            except Exception as e:
+                print(f"Error polling OCR jobs: {str(e)}")
+                batch = None
+
+            if batch:
+                self.claimed += batch["claimed"]
+                self.deferred += batch["deferred"]
+                self.completed += batch["completed"]
+                self.retried += batch["retried"]
+                self.dead_lettered += batch["dead_lettered"]
+                continue
+
+            # Nothing visible (or the DB is unreachable): back off until the next poll
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self):
+        """Let in-flight batches finish and stop polling; unclaimed jobs stay in the table"""
+        self.accepting = False
+        if self._stopping is not None:
+            self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def status(self):
+        status = {
+            "mode": "poll",
+            "accepting": self.accepting,
+            "workers": self.workers,
+            "claimed": self.claimed,
+            "rejected": self.rejected,
+            "deferred": self.deferred,
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
+        try:
+            status.update(self.job_queue.depth())
+        except Exception as e:
+            status["error"] = str(e)
+        return status
+
+
+async def run_pollers(workers):
+    poller = JobPoller(workers=workers)
+    poller.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Polling ocr_jobs with {workers} worker(s)")
+    await stop.wait()
+    await poller.drain()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process OCR jobs from the ocr_jobs table")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    parser.add_argument("--requeue-dead", action="store_true", help="Move dead-lettered jobs back to the queue and exit")
+    args = parser.parse_args()
+
+    if args.requeue_dead:
+        print(f"Requeued {JobQueue().requeue_dead()} dead-lettered job(s)")
+    else:
+        asyncio.run(run_pollers(args.workers))
@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Append one JSON object per timed stage to this file for offline analysis (disabled when unset)
+TRACE_LOG = os.getenv('OCR_TRACE_LOG')
+
+# From a few milliseconds for cache lookups up to a minute for a slow vision call
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    'ocr_stage_duration_seconds',
+    'Time spent in each stage of the receipt pipeline',
+    ['stage', 'outcome'],
+    buckets=STAGE_BUCKETS,
+)
+RECORDS_PROCESSED = Counter('ocr_records_processed_total', 'Records stored as receipts')
+RECORDS_FAILED = Counter('ocr_records_failed_total', 'Records that failed processing')
+RECORDS_RETRIED = Counter('ocr_records_retried_total', 'Failed ocr_jobs records scheduled for another attempt')
+RECORDS_DEAD_LETTERED = Counter('ocr_records_dead_lettered_total', 'ocr_jobs records moved to ocr_jobs_dead')
+PAYLOAD_BYTES = Counter(
+    'ocr_payload_bytes_total',
+    'Image bytes read from S3 and sent to the vision model',
+    ['direction'],
+)
+VISION_CALLS = Counter(
+    'ocr_vision_calls_total',
+    'Vision model requests, by whether they carried one receipt image or a batch',
+    ['mode'],
+)
+VISION_TOKENS = Counter(
+    'ocr_vision_tokens_total',
+    'Tokens billed for vision model requests, from the response usage metadata',
+    ['kind'],
+)
+VISION_FALLBACKS = Counter(
+    'ocr_vision_batch_fallbacks_total',
+    'Receipts missing or malformed in a batched response and retried with a single-image call',
+)
+
+_trace_lock = threading.Lock()
+
+
+def write_trace(entry):
+    if not TRACE_LOG:
+        return
+    line = json.dumps(entry, default=str)
+    try:
+        with _trace_lock, open(TRACE_LOG, 'a') as f:
+            f.write(line + '\n')
+    except Exception as e:
+        print(f"Error writing trace log: {str(e)}")
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a pipeline stage into ocr_stage_duration_seconds and the trace log.
+
+    Extra keyword arguments (object key, batch size, ...) only go to the trace log.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception as e:
+        outcome = 'error'
+        fields['error'] = str(e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage, outcome=outcome).observe(duration)
+        write_trace({
+            "ts": started_at,
+            "stage": stage,
+            "duration_ms": round(duration * 1000, 3),
+            "outcome": outcome,
+            **fields,
+        })
+
+
+def render():
+    """Prometheus text exposition of every metric in this process"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from psycopg2.extras import execute_values
+
+# Parsed receipts kept in memory, and how long any cached result stays valid
+CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', 1024))
+CACHE_TTL_SECONDS = int(os.getenv('OCR_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+
+
+def content_hash(image_data):
+    """SHA-256 of the raw image bytes, used as the cache key"""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class OcrCache:
+    """Two-level cache of extract_receipt_data results keyed by image content hash.
+
+    Lookups hit an in-memory LRU first and fall back to the ocr_cache table, so a
+    receipt re-uploaded under a new key never goes back to the vision model. Reads and
+    writes for a whole batch of records go through the caller's connection.
+    """
+
+    def __init__(self, connection, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.connection = connection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, conn, keys):
+        """Cached results for keys as {key: data}, reading every memory miss with one query on conn"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                data, stored_at = entry
+                if now - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    found[key] = data
+                else:
+                    del self._entries[key]
+                    self.evictions += 1
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        loaded = self._load(conn, missing) if missing else {}
+        with self._lock:
+            self.db_hits += len(loaded)
+            self.misses += len(missing) - len(loaded)
+        for key, data in loaded.items():
+            self._remember(key, data, now)
+        found.update(loaded)
+        return found
+
+    def put_many(self, conn, entries):
+        """Store {key: data} in memory and in the ocr_cache table, committing on conn"""
+        now = time.time()
+        for key, data in entries.items():
+            self._remember(key, data, now)
+        if not entries:
+            return
+        cursor = conn.cursor()
+        try:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO ocr_cache (content_hash, receipt_data) VALUES %s
+                ON CONFLICT (content_hash) DO UPDATE SET receipt_data = EXCLUDED.receipt_data, created_at = now()
+                """,
+                [(key, json.dumps(data)) for key, data in entries.items()],
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error writing {len(entries)} OCR cache entries: {str(e)}")
+        finally:
+            cursor.close()
+
+    def purge_expired(self):
+        """Delete rows older than the TTL from the ocr_cache table"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        "DELETE FROM ocr_cache WHERE created_at < now() - make_interval(secs => %s)",
+                        (self.ttl_seconds,),
+                    )
+                    conn.commit()
+                    return cursor.rowcount
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"Error purging OCR cache: {str(e)}")
+            return 0
+
+    def _remember(self, key, data, stored_at):
+        with self._lock:
+            self._entries[key] = (data, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _load(self, conn, keys):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT content_hash, receipt_data FROM ocr_cache
+                WHERE content_hash = ANY(%s) AND created_at >= now() - make_interval(secs => %s)
+                """,
+                (keys, self.ttl_seconds),
+            )
+            rows = cursor.fetchall()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error reading {len(keys)} OCR cache entries: {str(e)}")
+            return {}
+        finally:
+            cursor.close()
+        return {key: data if isinstance(data, dict) else json.loads(data) for key, data in rows}
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            }
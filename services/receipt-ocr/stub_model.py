@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import time
+from datetime import date, timedelta
+
+# Simulated round-trip time of a vision call, in milliseconds
+STUB_LATENCY_MS = float(os.getenv('STUB_MODEL_LATENCY_MS', 0))
+# Additional simulated time per image in the request
+STUB_IMAGE_LATENCY_MS = float(os.getenv('STUB_MODEL_IMAGE_LATENCY_MS', 0))
+
+# Gemini bills an image up to 384px a side as 258 tokens; text is estimated at 4 characters a token
+IMAGE_TOKENS = 258
+CHARS_PER_TOKEN = 4
+# Text part that names the object key of the next image in a batched request (handler.BATCH_KEY_LABEL)
+KEY_LABEL = 'Receipt key: '
+
+
+class StubUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class StubResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def stub_receipt(image):
+    """Receipt fields derived from the image bytes alone"""
+    digest = hashlib.sha256(image['data'].encode('utf-8')).digest()
+    seed = int.from_bytes(digest[:8], 'big')
+    return {
+        "total_amount": f"{(seed % 100000) / 100:.2f}",
+        "vendor_name": f"Stub Vendor {seed % 50}",
+        "receipt_date": (date(2024, 1, 1) + timedelta(days=seed % 365)).isoformat(),
+    }
+
+
+class StubVisionModel:
+    """Deterministic stand-in for genai.GenerativeModel used for local runs and benchmarks.
+
+    The same image bytes always produce the same receipt, so results can be compared across runs.
+    A request with several images, each preceded by a "Receipt key: <key>" part, is answered with
+    a JSON array keyed the same way, as handler.BATCH_PROMPT asks for.
+    """
+
+    def __init__(self, latency_ms=STUB_LATENCY_MS, image_latency_ms=STUB_IMAGE_LATENCY_MS):
+        self.latency_ms = latency_ms
+        self.image_latency_ms = image_latency_ms
+
+    def generate_content(self, contents):
+        images = []
+        key = None
+        text_chars = 0
+        for part in contents:
+            if isinstance(part, dict):
+                images.append((key, part))
+                key = None
+            else:
+                text_chars += len(part)
+                if part.startswith(KEY_LABEL):
+                    key = part[len(KEY_LABEL):]
+
+        delay = self.latency_ms + self.image_latency_ms * len(images)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if len(images) == 1:
+            text = f"```json\n{json.dumps(stub_receipt(images[0][1]))}\n```"
+        else:
+            text = f"```json\n{json.dumps([{'key': key, **stub_receipt(image)} for key, image in images])}\n```"
+        usage = StubUsage(IMAGE_TOKENS * len(images) + text_chars // CHARS_PER_TOKEN, len(text) // CHARS_PER_TOKEN)
+        return StubResponse(text, usage)
@@ -0,0 +1,112 @@
+"""Backfill list-view thumbnails for receipts stored before the worker wrote them.
+
+Walks receipts that have an s3_url but no thumbnail_url in receipt_id order, fetches each
+original from S3, writes its thumbnail the same way the worker does and records the URL.
+Receipts whose thumbnail fails stay NULL and are reported; rerunning retries them.
+Run from services/receipt-ocr with the worker's environment:
+
+    python thumbnails.py --batch-size 100 --workers 8
+    python thumbnails.py --dry-run
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+import handler
+from metrics import span
+
+S3_BUCKET = os.getenv('S3_BUCKET')
+
+PENDING_QUERY = """
+    SELECT receipt_id, s3_url FROM receipts
+    WHERE s3_url IS NOT NULL AND thumbnail_url IS NULL AND receipt_id > %s
+    ORDER BY receipt_id
+    LIMIT %s
+"""
+
+# thumbnail_url is outside the columns the monthly_expenses and vendor_key triggers watch
+UPDATE_QUERY = """
+    UPDATE receipts SET thumbnail_url = v.thumbnail_url
+    FROM (VALUES %s) AS v (receipt_id, thumbnail_url)
+    WHERE receipts.receipt_id = v.receipt_id::uuid AND receipts.thumbnail_url IS NULL
+"""
+
+
+def object_key_for(s3_url):
+    """Invert prepare_db_data's s3_url = S3_ENDPOINT + object_key"""
+    if handler.S3_ENDPOINT and s3_url.startswith(handler.S3_ENDPOINT):
+        return s3_url[len(handler.S3_ENDPOINT):]
+    return s3_url.rsplit('/', 1)[-1]
+
+
+def backfill_one(s3_client, bucket, receipt_id, s3_url):
+    """Returns (receipt_id, thumbnail_url or None, original bytes)"""
+    object_key = object_key_for(s3_url)
+    try:
+        with span('get_object', key=object_key):
+            image_data = s3_client.get_object(Bucket=bucket, Key=object_key)['Body'].read()
+    except Exception as e:
+        print(f"Error fetching {object_key}: {str(e)}")
+        return receipt_id, None, 0
+    return receipt_id, handler.store_thumbnail(s3_client, bucket, object_key, image_data), len(image_data)
+
+
+def backfill(services, bucket, batch_size, workers, limit=None, dry_run=False):
+    totals = {"receipts": 0, "thumbnails": 0, "failed": 0, "original_bytes": 0}
+    last_id = '00000000-0000-0000-0000-000000000000'
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while limit is None or totals["receipts"] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - totals["receipts"])
+            with services.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(PENDING_QUERY, (last_id, size))
+                pending = cursor.fetchall()
+                conn.rollback()
+            if not pending:
+                break
+            last_id = pending[-1][0]
+            totals["receipts"] += len(pending)
+            if dry_run:
+                continue
+
+            results = list(executor.map(lambda row: backfill_one(services.s3_client, bucket, *row), pending))
+            done = [(receipt_id, url) for receipt_id, url, _ in results if url]
+            totals["thumbnails"] += len(done)
+            totals["failed"] += len(results) - len(done)
+            totals["original_bytes"] += sum(original_bytes for _, url, original_bytes in results if url)
+            if done:
+                with services.connection() as conn, conn.cursor() as cursor:
+                    execute_values(cursor, UPDATE_QUERY, done, page_size=len(done))
+                    conn.commit()
+            print(f"Backfilled {totals['thumbnails']}/{totals['receipts']} thumbnails, {totals['failed']} failed")
+
+    totals["elapsed_s"] = round(time.perf_counter() - start, 1)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write thumbnails for receipts that do not have one yet")
+    parser.add_argument("--bucket", default=S3_BUCKET, help="Bucket holding the originals (default: S3_BUCKET)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=handler.MAX_WORKERS)
+    parser.add_argument("--limit", type=int, help="Stop after this many receipts")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the receipts that need a thumbnail")
+    args = parser.parse_args()
+    if not args.bucket:
+        parser.error("--bucket or S3_BUCKET is required")
+
+    services = handler.ServiceContext(pool_max=2)
+    try:
+        totals = backfill(services, args.bucket, args.batch_size, args.workers, args.limit, args.dry_run)
+    finally:
+        services.close()
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+
+from handler import lambda_handler
+
+# Workers draining the queue, each handling up to QUEUE_BATCH_SIZE records per lambda_handler call
+QUEUE_WORKERS = int(os.getenv('OCR_QUEUE_WORKERS', 2))
+QUEUE_BATCH_SIZE = int(os.getenv('OCR_QUEUE_BATCH_SIZE', 8))
+# Records allowed to wait before /event starts answering 429
+QUEUE_MAX_DEPTH = int(os.getenv('OCR_QUEUE_MAX_DEPTH', 1000))
+# Seconds to wait for queued records to finish on shutdown
+QUEUE_DRAIN_TIMEOUT = float(os.getenv('OCR_QUEUE_DRAIN_TIMEOUT', 30))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WorkQueue:
+    """In-process queue of S3 event records drained by a fixed pool of asyncio workers.
+
+    The blocking pipeline in lambda_handler runs in a thread so the event loop stays
+    free to accept events and answer health checks.
+    """
+
+    def __init__(self, workers=QUEUE_WORKERS, batch_size=QUEUE_BATCH_SIZE, max_depth=QUEUE_MAX_DEPTH):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_depth = max_depth
+        self.queue = asyncio.Queue(maxsize=max_depth)
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.accepting = False
+        self._tasks = []
+
+    def start(self):
+        self.accepting = True
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, records):
+        """Enqueue all records or none of them"""
+        if not self.accepting or self.queue.qsize() + len(records) > self.max_depth:
+            self.rejected += len(records)
+            raise QueueFull(f"Queue is full ({self.queue.qsize()}/{self.max_depth})")
+        for record in records:
+            self.queue.put_nowait(record)
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            self.in_flight += len(batch)
+            try:
+                result = await asyncio.to_thread(lambda_handler, {"Records": batch})
+                body = json.loads(result["body"])
+                self.processed += body.get("processed", 0)
+                self.failed += body.get("failed", 0)
+            except Exception as e:
+                print(f"Error processing queued batch: {str(e)}")
+                self.failed += len(batch)
+            finally:
+                self.in_flight -= len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def drain(self, timeout=QUEUE_DRAIN_TIMEOUT):
+        """Stop accepting events, wait for queued records to finish and stop the workers"""
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Shutdown with {self.queue.qsize()} record(s) still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def status(self):
+        return {
+            "mode": "push",
+            "accepting": self.accepting,
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "in_flight": self.in_flight,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }